@@ -3,11 +3,22 @@ import sys
 from imgutils.detect import detect_heads
 
 from .base import BaseDetector
+from .backend import YoloBatchBackend
 
 class HeadDetector(BaseDetector):
-    def detect(self, image_path, model_name="head_detect_v2.0_x_yv11"):
-        return detect_heads(image_path, model_name)
+    model_name = "head_detect_v2.0_x_yv11"
+
+    def detect(self, image_path, model_name=None):
+        if self.backend is not None:
+            return super().detect(image_path)
+        return detect_heads(image_path, model_name=model_name or self.model_name)
+
+    # [新增] 批次推論沿用 imgutils 的 head 模型與預設閾值
+    def create_batch_backend(self):
+        return YoloBatchBackend.from_imgutils(
+            "deepghs/anime_head_detection", self.model_name, conf_threshold=0.4, iou_threshold=0.7
+        )
     
     # [修改] 增加 index 參數並傳遞給 super()
-    def create_info(self, origin_rect, mask_rect, mode="head", index=None):
-        return super().create_info(origin_rect, mask_rect, mode, index=index)
\ No newline at end of file
+    def create_info(self, origin_rect, mask_rect, mode="head", index=None, base_filename=None):
+        return super().create_info(origin_rect, mask_rect, mode, index=index, base_filename=base_filename)
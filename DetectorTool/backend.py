@@ -0,0 +1,81 @@
+import numpy as np
+from imgutils.data import load_image, rgb_encode
+from imgutils.generic.yolo import _image_preprocess, _rtdetr_postprocess, _yolo_postprocess
+
+
+POSTPROCESS = {"yolo": _yolo_postprocess, "rtdetr": _rtdetr_postprocess}
+
+
+class YoloBatchBackend:
+    """
+    以單一 ONNX session 批次推論多張影像的 YOLO 偵測後端。
+    - 前處理與後處理直接沿用 imgutils（YOLOModel.predict 使用的函式），結果與逐張偵測相同。
+    - 每張影像縮放到相同的 max_infer_size 後疊成 (N, 3, H, W) 一次送進模型。
+    - 模型 batch 維度固定為 1 時，改為逐張執行（仍共用前處理與 session）。
+    - lock 為 imgutils 與 session 綁定的執行鎖，與逐張偵測共用同一個 session 時避免同時執行。
+    - 呼叫方式：backend(images) -> [[(bbox, label, score), ...], ...]
+    """
+
+    def __init__(self, session, labels, max_infer_size=640, conf_threshold=0.25, iou_threshold=0.7,
+                 lock=None, model_type="yolo"):
+        self.session = session
+        self.labels = list(labels)
+        self.max_infer_size = max_infer_size
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.lock = lock
+        self.postprocess = POSTPROCESS[model_type]
+        model_input = session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.output_name = session.get_outputs()[0].name
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
+
+    @classmethod
+    def from_imgutils(cls, repo_id, model_name, conf_threshold=0.25, iou_threshold=0.7):
+        """沿用 imgutils 已快取的模型 session；取得失敗時回傳 None"""
+        try:
+            from imgutils.generic.yolo import _open_models_for_repo_id
+
+            model = _open_models_for_repo_id(repo_id)
+            # imgutils 0.19 起回傳 (session, max_infer_size, labels, lock)
+            opened = model._open_model(model_name)
+            session, max_infer_size, labels = opened[:3]
+            lock = opened[3] if len(opened) > 3 else None
+            return cls(
+                session, labels, max_infer_size, conf_threshold, iou_threshold,
+                lock=lock, model_type=model._get_model_type(model_name),
+            )
+        except Exception as e:
+            print(f"無法建立批次推論後端，改為逐張偵測: {e}")
+            return None
+
+    def _run(self, batch):
+        if self.lock is None:
+            return self.session.run([self.output_name], {self.input_name: batch})[0]
+        with self.lock:
+            return self.session.run([self.output_name], {self.input_name: batch})[0]
+
+    def __call__(self, images):
+        if not images:
+            return []
+        sizes, batch = [], []
+        for image in images:
+            resized, old_size, new_size = _image_preprocess(load_image(image, mode="RGB"), self.max_infer_size)
+            sizes.append((old_size, new_size))
+            batch.append(rgb_encode(resized))
+        batch = np.stack(batch)
+        if self.dynamic_batch:
+            output = self._run(batch)
+        else:
+            output = np.concatenate([self._run(data[np.newaxis]) for data in batch])
+        return [
+            self.postprocess(
+                output=pred,
+                conf_threshold=self.conf_threshold,
+                iou_threshold=self.iou_threshold,
+                old_size=old_size,
+                new_size=new_size,
+                labels=self.labels,
+            )
+            for pred, (old_size, new_size) in zip(output, sizes)
+        ]
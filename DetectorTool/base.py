@@ -1,9 +1,17 @@
 import os
 import json
+import numpy as np
 from PIL import Image, ImageDraw, ImageFilter, ImageChops
 
+from .cache import file_digest, image_digest
+from .store import DetectionStore
+from .tiling import merge_tiles, tile_grid
+
 
 class Rect:
+    # [新增] 大量保存時省去每個物件的 __dict__
+    __slots__ = ("x1", "y1", "x2", "y2")
+
     def __init__(self, x1: int, y1: int, x2: int, y2: int):
         self.x1 = x1
         self.y1 = y1
@@ -42,6 +50,11 @@ class Rect:
 
 
 class RectInfo:
+    __slots__ = (
+        "mode", "base_filename", "filename", "rect_filename", "mask_name", "origin_rect", "mask_rect",
+        "mask_offset", "canvas_size", "frame_index", "timestamp",
+    )
+
     def __init__(
         self, origin_rect: Rect, mask_rect: Rect, base_filename="", mode="", filter=""
     ):
@@ -55,9 +68,15 @@ class RectInfo:
         self.mask_name = f"{self.filename}_mask"
         self.origin_rect = origin_rect
         self.mask_rect = mask_rect
+        # [新增] 精簡遮罩（只涵蓋裁切區域）時，遮罩左上角在原圖中的位置與原圖尺寸
+        self.mask_offset = None
+        self.canvas_size = None
+        # [新增] 來源為影片畫面時的畫面編號與時間（秒）
+        self.frame_index = None
+        self.timestamp = None
 
     def to_dict(self):
-        return {
+        data = {
             "base_filename": self.base_filename,
             "filename": self.filename,
             "rect_filename": self.rect_filename,
@@ -66,6 +85,13 @@ class RectInfo:
             "origin_rect": self.origin_rect.to_dict(),
             "mask_rect": self.mask_rect.to_dict(),
         }
+        if self.mask_offset is not None:
+            data["mask_offset"] = list(self.mask_offset)
+            data["canvas_size"] = list(self.canvas_size)
+        if self.frame_index is not None:
+            data["frame_index"] = self.frame_index
+            data["timestamp"] = self.timestamp
+        return data
 
     def to_json(self):
         return json.dumps(self.to_dict())
@@ -74,17 +100,24 @@ class RectInfo:
         with open(filename, "w") as f:
             json.dump(self.to_dict(), f, indent=4)
 
+    # [修改] filename 等欄位無法由建構子還原（filter 未記錄），改為建立後直接覆寫
     @classmethod
     def from_dict(cls, data):
-        return cls(
-            filename=data.get("filename", ""),
-            rect_filename=data.get("rect_filename", ""),
-            mask_name=data.get("mask_name", ""),
+        info = cls(
             origin_rect=Rect.from_dict(data["origin_rect"]),
             mask_rect=Rect.from_dict(data["mask_rect"]),
             base_filename=data.get("base_filename", ""),
             mode=data.get("mode", ""),
         )
+        info.filename = data.get("filename", info.filename)
+        info.rect_filename = data.get("rect_filename", info.rect_filename)
+        info.mask_name = data.get("mask_name", info.mask_name)
+        if data.get("mask_offset") is not None:
+            info.mask_offset = tuple(data["mask_offset"])
+            info.canvas_size = tuple(data["canvas_size"])
+        info.frame_index = data.get("frame_index")
+        info.timestamp = data.get("timestamp")
+        return info
 
     @classmethod
     def from_json(cls, json_str):
@@ -93,14 +126,136 @@ class RectInfo:
 
 
 class BaseDetector:
-    def __init__(self, output="output", width=260, height=340, make_dirs=True):
+    model_name = ""
+
+    # [修改] 增加 backend 參數，可注入批次偵測後端（callable: List[Image] -> List[result]）
+    def __init__(self, output="output", width=260, height=340, make_dirs=True, backend=None):
         self.output = output
         self.width = width
         self.height = height
         self.filter = ""
+        self.backend = backend
+        self._batch_backend = None
+        # [新增] 偵測結果快取（DetectionCache），None 表示停用
+        self.cache = None
+        # [新增] RectInfo 的紀錄目標（DetectionManifest 或 list），None 表示每個偵測各寫一個 JSON 檔
+        self.manifest = None
+        # [新增] 偵測結果的後處理（PostProcessor：NMS / 合併重疊框 / 分數下限），None 表示不處理
+        self.postprocessor = None
+        # [新增] 分塊偵測：tile_size 不為 None 時 detect_cached / detect_batch 改用 detect_tiled
+        self.tile_size = None
+        self.tile_overlap = 128
         if make_dirs and not os.path.exists(self.output):
             os.makedirs(self.output, exist_ok=True)
 
+    def detect(self, image_path):
+        """使用注入的 backend 偵測單張影像；子類別覆寫為實際的模型呼叫"""
+        return self.backend([self.load_image(image_path)])[0]
+
+    # [新增] 先查偵測快取，未命中才呼叫 detect 並寫回
+    # [修改] 快取保存原始結果，回傳前才套用 postprocessor
+    def detect_cached(self, image_path):
+        if self.tile_size:
+            return self.detect_tiled(image_path)
+        if self.cache is None:
+            return self.postprocess(self.detect(image_path))
+        key = self.cache_key(image_path)
+        result = self.cache.get(key, self.model_name)
+        if result is None:
+            result = self.detect(image_path)
+            self.cache.put(key, self.model_name, result)
+        return self.postprocess(result)
+
+    def postprocess(self, result):
+        """套用 postprocessor；未設定時原樣回傳"""
+        if self.postprocessor is None or not result:
+            return result
+        return self.postprocessor(result)
+
+    def cache_key(self, image_path):
+        """來自檔案的影像以檔案內容雜湊，其餘以像素內容雜湊"""
+        if isinstance(image_path, (str, os.PathLike)):
+            return file_digest(image_path)
+        filename = getattr(image_path, "filename", "")
+        if filename and os.path.isfile(filename):
+            return file_digest(filename)
+        return image_digest(self.load_image(image_path))
+
+    # [新增] 批次偵測：每 batch_size 張影像合併為一次推論，結果依輸入順序回傳
+    # [修改] 有設定 cache 時只對未命中的影像推論
+    def detect_batch(self, images, batch_size=8):
+        if self.tile_size:
+            # 分塊模式中每張影像的分塊已經批次推論
+            return [self.detect_tiled(image, batch_size=batch_size) for image in images]
+        results = [None] * len(images)
+        keys = [None] * len(images)
+        pending = []
+        for i, image in enumerate(images):
+            if self.cache is not None:
+                keys[i] = self.cache_key(image)
+                results[i] = self.cache.get(keys[i], self.model_name)
+            if results[i] is None:
+                pending.append(i)
+        if not pending:
+            return [self.postprocess(result) for result in results]
+
+        backend = self.backend or self.get_batch_backend()
+        for start in range(0, len(pending), batch_size):
+            indices = pending[start:start + batch_size]
+            chunk = [self.load_image(images[i]) for i in indices]
+            if backend is None:
+                detections = [self.detect(image) for image in chunk]
+            else:
+                detections = backend(chunk)
+            for i, result in zip(indices, detections):
+                results[i] = result
+                if self.cache is not None:
+                    self.cache.put(keys[i], self.model_name, result)
+        return [self.postprocess(result) for result in results]
+
+    # [新增] 分塊偵測：大圖切成重疊的分塊批次推論，結果平移回原圖座標後跨接縫以 NMS 合併
+    def detect_tiled(self, image_path, tile_size=None, overlap=None, batch_size=8):
+        """
+        影像只解碼一次，各分塊以 crop 取得後送進批次後端（沒有後端時逐塊呼叫 detect）
+        整張影像只有一塊時與一般偵測相同；快取以分塊設定區分
+        """
+        tile_size = tile_size or self.tile_size
+        overlap = self.tile_overlap if overlap is None else overlap
+        image = self.load_image(image_path)
+        tiles = tile_grid(image.size, tile_size, overlap)
+        model = self.model_name if len(tiles) == 1 else f"{self.model_name}@tile{tile_size}/{overlap}"
+        key = self.cache_key(image) if self.cache is not None else None
+        result = self.cache.get(key, model) if key is not None else None
+        if result is None:
+            if len(tiles) == 1:
+                result = self.detect(image)
+            else:
+                result = self._detect_tiles(image, tiles, batch_size)
+            if key is not None:
+                self.cache.put(key, model, result)
+        return self.postprocess(result)
+
+    def _detect_tiles(self, image, tiles, batch_size):
+        image.load()
+        backend = self.backend or self.get_batch_backend()
+        results = []
+        for start in range(0, len(tiles), batch_size):
+            chunk = [image.crop(tile) for tile in tiles[start:start + batch_size]]
+            if backend is None:
+                results.extend(self.detect(crop) for crop in chunk)
+            else:
+                results.extend(backend(chunk))
+        return merge_tiles(results, tiles)
+
+    def get_batch_backend(self):
+        """延遲建立並快取預設的批次後端；無法建立時回傳 None（改為逐張偵測）"""
+        if self._batch_backend is None:
+            self._batch_backend = self.create_batch_backend() or False
+        return self._batch_backend or None
+
+    def create_batch_backend(self):
+        return None
+
     def create_blurred_alpha_mask(self, image_path, rect, blur_size):
         img, origin_alpha, mask, _ = self.create_mask(image_path, rect)
         mask = Image.composite(origin_alpha, mask, mask)
@@ -109,32 +264,39 @@ class BaseDetector:
         img.putalpha(mask)
         return img, mask
 
+    # [修改] 改用 NumPy 向量化計算，取代逐像素的雙層迴圈
     def create_fadeout_mask(self, mask_size, origin_rect, blur_size):
-        x1, y1, x2, y2 = origin_rect.x1, origin_rect.y1, origin_rect.x2, origin_rect.y2
+        """在 origin_rect 內建立圓角距離淡出遮罩（邊緣 blur_size 像素內線性淡出）"""
+        x1, y1, x2, y2 = map(int, origin_rect.to_tuple())
         fade_mask = Image.new("L", mask_size, 0)
-        pixels = fade_mask.load()
-        for y in range(y1, y2):
-            for x in range(x1, x2):
-                dx = 0
-                if x < x1 + blur_size:
-                    dx = x1 + blur_size - x
-                elif x > x2 - blur_size - 1:
-                    dx = x - (x2 - blur_size - 1)
-                dy = 0
-                if y < y1 + blur_size:
-                    dy = y1 + blur_size - y
-                elif y > y2 - blur_size - 1:
-                    dy = y - (y2 - blur_size - 1)
-                d = (dx**2 + dy**2) ** 0.5
-                if d >= blur_size:
-                    alpha = 0
-                else:
-                    alpha = int(255 * (1 - d / blur_size))
-                pixels[x, y] = alpha
+        # 只計算落在畫布內的部分
+        left, top = max(0, x1), max(0, y1)
+        right, bottom = min(mask_size[0], x2), min(mask_size[1], y2)
+        if right <= left or bottom <= top:
+            return fade_mask
+        xs = np.arange(left, right, dtype=np.float64)
+        ys = np.arange(top, bottom, dtype=np.float64)
+        # 與邊緣的水平 / 垂直距離（中間區域為 0）
+        dx = np.where(
+            xs < x1 + blur_size,
+            x1 + blur_size - xs,
+            np.where(xs > x2 - blur_size - 1, xs - (x2 - blur_size - 1), 0),
+        )
+        dy = np.where(
+            ys < y1 + blur_size,
+            y1 + blur_size - ys,
+            np.where(ys > y2 - blur_size - 1, ys - (y2 - blur_size - 1), 0),
+        )
+        d = np.sqrt(dx[np.newaxis, :] ** 2 + dy[:, np.newaxis] ** 2)
+        alpha = np.where(d >= blur_size, 0, 255 * (1 - d / blur_size))
+        fade_mask.paste(Image.fromarray(alpha.astype(np.uint8), "L"), (left, top))
         return fade_mask
 
     # [修改] 增加 index 參數
-    def create_blurred_mask(self, image_path, rect, blur_size, index=None):
+    # [修改] 增加 compact 參數：只在裁切區域內計算遮罩，回傳裁切大小的影像與遮罩
+    def create_blurred_mask(self, image_path, rect, blur_size, index=None, compact=False):
+        if compact:
+            return self.create_compact_blurred_mask(image_path, rect, blur_size, index=index)
         img, _, mask, origin_rect = self.create_mask(image_path, rect)
         if blur_size > 0:
             x1, y1, x2, y2 = (
@@ -160,19 +322,61 @@ class BaseDetector:
             )
         else:
             mask_rect = origin_rect
-        self.base_filename = os.path.basename(image_path).split(".")[0]
-        # [修改] 傳遞 index 參數
-        info = self.create_info(origin_rect, mask_rect, index=index)
+        base_filename = self.image_name(image_path).split(".")[0]
+        self.base_filename = base_filename
+        # [修改] 傳遞 index 參數；base_filename 直接傳入，避免多執行緒共用 self.base_filename
+        info = self.create_info(origin_rect, mask_rect, index=index, base_filename=base_filename)
+        return img, mask, info
+
+    # [新增] 精簡版：只配置 origin_rect（含 blur 外擴）大小的遮罩，偏移量記錄在 RectInfo
+    def create_compact_blurred_mask(self, image_path, rect, blur_size, index=None):
+        image = self.load_image(image_path)
+        img_w, img_h = image.size
+        x1, y1, x2, y2 = map(int, rect)
+        if blur_size > 0:
+            mask_rect = Rect(
+                max(0, x1 + blur_size),
+                max(0, y1 + blur_size),
+                min(img_w, x2 - blur_size),
+                min(img_h, y2 - blur_size),
+            )
+            origin_rect = Rect(
+                max(0, x1 - blur_size),
+                max(0, y1 - blur_size),
+                min(img_w, x2 + blur_size),
+                min(img_h, y2 + blur_size),
+            )
+        else:
+            mask_rect = origin_rect = Rect(x1, y1, x2, y2)
+
+        # 在區域座標系中畫出與全畫布版本相同的遮罩
+        region_size = (origin_rect.width, origin_rect.height)
+        local_rect = Rect(x1 - origin_rect.x1, y1 - origin_rect.y1, x2 - origin_rect.x1, y2 - origin_rect.y1)
+        mask = Image.new("L", region_size, 0)
+        ImageDraw.Draw(mask).rectangle(list(local_rect.to_tuple()), fill=255)
+        if blur_size > 0:
+            mask = ImageChops.darker(mask, self.create_fadeout_mask(region_size, local_rect, blur_size))
+        img = image.crop(origin_rect.to_tuple())
+        if img.mode != "RGBA":
+            img = img.convert("RGBA")
+
+        base_filename = self.image_name(image_path).split(".")[0]
+        self.base_filename = base_filename
+        info = self.create_info(origin_rect, mask_rect, index=index, base_filename=base_filename)
+        info.mask_offset = (origin_rect.x1, origin_rect.y1)
+        info.canvas_size = (img_w, img_h)
         return img, mask, info
 
     # [修改] 增加 index 參數
-    def create_info(self, origin_rect, mask_rect, mode="", index=None):
+    def create_info(self, origin_rect, mask_rect, mode="", index=None, base_filename=None):
+        if base_filename is None:
+            base_filename = self.base_filename
         suffix = f"_{index}" if index is not None else ""
-        info = RectInfo(origin_rect, mask_rect, self.base_filename + suffix, mode, self.filter)
+        info = RectInfo(origin_rect, mask_rect, base_filename + suffix, mode, self.filter)
         return info
 
     def create_mask(self, image_path, rect):
-        image = Image.open(image_path)
+        image = self.load_image(image_path)
         if image.mode != "RGBA":
             img = image.convert("RGBA")
         else:
@@ -189,8 +393,8 @@ class BaseDetector:
         return img, origin_alpha, mask, origin_rect
 
     def crop(self, image_path, result, bbox=None):
-        img = Image.open(image_path)
-        image = os.path.basename(image_path)
+        img = self.load_image(image_path)
+        image = self.image_name(image_path)
         width, height = self.width, self.height
         if result:
             if bbox is not None:
@@ -218,9 +422,12 @@ class BaseDetector:
             return cropped, image, bbox
         return None, image, None
 
+    # [修改] result 也可以是 DetectionStore（視為一份偵測結果，依分數取最高）
     def get_best_rect(self, result, filter_label=None):
         if filter_label is not None:
             self.filter = filter_label
+        if isinstance(result, DetectionStore):
+            return result.best(filter_label or None)
         if filter_label:
             filtered = [r for r in result if r[1] == filter_label]
             if not filtered:
@@ -239,9 +446,11 @@ class BaseDetector:
 
     # [新增] 回傳前 N 個結果的 bbox 列表
     def get_top_rects(self, result, filter_label=None, top_n=3):
-        """回傳前 N 個結果的 bbox 列表"""
+        """回傳前 N 個結果的 bbox 列表；result 也可以是 DetectionStore"""
         if filter_label is not None:
             self.filter = filter_label
+        if isinstance(result, DetectionStore):
+            return result.top_rects(top_n, filter_label or None)
         if filter_label:
             filtered = [r for r in result if r[1] == filter_label]
             if not filtered:
@@ -272,8 +481,8 @@ class BaseDetector:
         - resize=True 時，等比縮放並以背景補邊到精確 (crop_width, crop_height)。
         - bg_path 提供背景圖時，會將裁切結果合成到背景上（僅支援 PNG 格式）。
         """
-        source_image = Image.open(image_path)
-        filename = os.path.basename(image_path).split(".")[0]
+        source_image = self.load_image(image_path)
+        filename = self.image_name(image_path).split(".")[0]
         
         if not detections:
             return None, filename
@@ -357,16 +566,18 @@ class BaseDetector:
         return cropped_image, filename
     
     def DetectAndForceRectCrop(self, image_path, rect, resize=False, bg_path=None):
-        result = self.detect(image_path)
-        cropped, image = self.force_rect_crop(image_path, result, rect, rect, resize, bg_path)
+        source_image = self.load_image(image_path)
+        result = self.detect(source_image)
+        cropped, image = self.force_rect_crop(source_image, result, rect, rect, resize, bg_path)
         if cropped:
             self.save_image(cropped, image)
         print(result)
         return cropped
 
     def DetectAndCrop(self, image_path):
-        result = self.detect(image_path)
-        cropped, image, bbox = self.crop(image_path, result)
+        source_image = self.load_image(image_path)
+        result = self.detect(source_image)
+        cropped, image, bbox = self.crop(source_image, result)
         if cropped:
             self.save_image(cropped, image)
         print(result)
@@ -378,9 +589,9 @@ class BaseDetector:
         return bbox
 
     def Crop(self, image_path, rect, rect_name=None):
-        img = Image.open(image_path)
+        img = self.load_image(image_path)
         if not rect_name:
-            image = os.path.basename(image_path)
+            image = self.image_name(image_path)
         else:
             image = rect_name
         x1, y1, x2, y2 = map(int, rect)
@@ -388,8 +599,30 @@ class BaseDetector:
         self.save_image(cropped, image)
         return cropped, image
 
+    # [修改] 回傳實際寫出的檔案路徑
     def save_image(self, image, filename):
-        image.save(os.path.join(self.output, f"{filename}.png"))
+        path = self.output_path(filename)
+        image.save(path)
+        return path
+
+    def output_path(self, filename, ext="png"):
+        return os.path.join(self.output, f"{filename}.{ext}")
 
+    # [新增] 以空白影像跑一次偵測，讓模型 session 先載入並快取
+    def warmup(self):
+        self.detect(Image.new("RGB", (64, 64)))
+
+    # [修改] 支援直接傳入已載入的 PIL Image / NumPy 陣列，避免重複解碼
     def load_image(self, image_path):
-        return Image.open(image_path)
\ No newline at end of file
+        """路徑會以 Image.open 開啟；已載入的影像原樣回傳"""
+        if isinstance(image_path, Image.Image):
+            return image_path
+        if isinstance(image_path, np.ndarray):
+            return Image.fromarray(image_path)
+        return Image.open(image_path)
+
+    # [新增] 取得影像的檔名（路徑或 Image.filename）
+    def image_name(self, image_path):
+        if isinstance(image_path, (str, os.PathLike)):
+            return os.path.basename(image_path)
+        return os.path.basename(getattr(image_path, "filename", "") or "")
\ No newline at end of file
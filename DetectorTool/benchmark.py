@@ -0,0 +1,208 @@
+"""
+偵測 / 裁切流程的效能測試工具（離線，不需要模型）
+
+以合成的 RGBA 圖片與固定輸出的 stub detect() 分別量測 BaseDetector 各階段，
+並跑一次完整的 detector.py 流程，輸出 images/s、p50/p99 延遲與峰值 RSS。
+
+  python -m DetectorTool.benchmark --sizes 1024x1024 2048x2048 --images 8 --json bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import PIL
+from PIL import Image
+
+from .base import BaseDetector, Rect
+from . import detector as detector_cli
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class StubDetector(BaseDetector):
+    """回傳固定偵測框的 detector，位置依圖片尺寸決定"""
+
+    def detect(self, image_path):
+        image = self.load_image(image_path)
+        w, h = image.size
+        box = min(w, h) // 6
+        result = []
+        for i, (cx, cy) in enumerate([(w // 2, h // 3), (w // 4, h // 2), (3 * w // 4, 2 * h // 3)]):
+            bbox = (cx - box // 2, cy - box // 2, cx + box // 2, cy + box // 2)
+            result.append((bbox, "head", 0.9 - i * 0.1))
+        return result
+
+    def create_info(self, origin_rect, mask_rect, mode="head", index=None, base_filename=None):
+        return super().create_info(origin_rect, mask_rect, mode, index=index, base_filename=base_filename)
+
+
+def make_image(width, height, seed=0):
+    """產生帶漸層、色塊與透明邊緣的合成 RGBA 圖片"""
+    rng = np.random.default_rng(seed)
+    ys, xs = np.mgrid[0:height, 0:width]
+    rgba = np.empty((height, width, 4), dtype=np.uint8)
+    rgba[..., 0] = (xs * 255 // max(1, width - 1)).astype(np.uint8)
+    rgba[..., 1] = (ys * 255 // max(1, height - 1)).astype(np.uint8)
+    rgba[..., 2] = ((xs + ys) % 256).astype(np.uint8)
+    for _ in range(12):
+        x1, x2 = sorted(rng.integers(0, width, 2))
+        y1, y2 = sorted(rng.integers(0, height, 2))
+        rgba[y1:y2, x1:x2, :3] = rng.integers(0, 256, 3, dtype=np.uint8)
+    cx, cy = width / 2, height / 2
+    dist = ((xs - cx) / cx) ** 2 + ((ys - cy) / cy) ** 2
+    rgba[..., 3] = np.where(dist < 1, 255, 0).astype(np.uint8)
+    return Image.fromarray(rgba, "RGBA")
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 單位為 KB，macOS 為 bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(name, latencies, items):
+    latencies = np.asarray(latencies)
+    total = float(latencies.sum())
+    return {
+        "stage": name,
+        "calls": int(len(latencies)),
+        "images": items,
+        "images_per_s": items / total if total > 0 else 0.0,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "total_s": total,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def measure(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_stages(detector, images, args):
+    """分別量測 BaseDetector 各階段（每張圖取最高分的偵測框）"""
+    stages = {name: [] for name in (
+        "create_mask", "create_fadeout_mask", "create_blurred_mask",
+        "crop", "force_rect_crop", "save_image",
+    )}
+    for i, image in enumerate(images):
+        result = detector.detect(image)
+        bbox = detector.get_top_rects(result, top_n=1)[0]
+        rect = Rect(*bbox)
+        stages["create_mask"] += measure(lambda: detector.create_mask(image, bbox), args.repeat)
+        stages["create_fadeout_mask"] += measure(
+            lambda: detector.create_fadeout_mask(image.size, rect, args.blur_size), args.repeat
+        )
+        stages["create_blurred_mask"] += measure(
+            lambda: detector.create_blurred_mask(image, bbox, args.blur_size, index=1), args.repeat
+        )
+        stages["crop"] += measure(lambda: detector.crop(image, result), args.repeat)
+        stages["force_rect_crop"] += measure(
+            lambda: detector.force_rect_crop(image, result, args.width, args.height, resize=True), args.repeat
+        )
+        cropped = image.crop(bbox)
+        stages["save_image"] += measure(lambda: detector.save_image(cropped, f"bench_{i}"), args.repeat)
+    return [summarize(name, latencies, len(latencies)) for name, latencies in stages.items()]
+
+
+def bench_flow(folder, output, args):
+    """以 stub detector 跑完整的 detector.py --mask 流程（含解碼與 PNG 編碼）"""
+    cli_args = detector_cli.create_parser().parse_args([
+        "--mode", "head", "-f", folder, "-o", output, "--mask", "--info",
+        "--blur_size", str(args.blur_size), "--top_n", str(args.top_n), "--no-cache",
+    ])
+    detector = StubDetector(output=output, width=args.width, height=args.height)
+    img_paths = detector_cli.list_images(folder)
+    latencies = []
+    for _ in range(args.repeat):
+        for img_path in img_paths:
+            start = time.perf_counter()
+            detector_cli.process_image(detector, cli_args, img_path)
+            latencies.append(time.perf_counter() - start)
+    return summarize("detector_flow", latencies, len(latencies))
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(description="Offline benchmark for the detection / cropping pipeline")
+    parser.add_argument("--sizes", type=parse_size, nargs="+", default=[(1024, 1024), (2048, 2048)],
+                        metavar="WxH", help="Synthetic image sizes")
+    parser.add_argument("--images", type=int, default=4, help="Images per size")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions per image")
+    parser.add_argument("-b", "--blur_size", type=int, default=32)
+    parser.add_argument("--top_n", type=int, default=3)
+    parser.add_argument("--width", type=int, default=260)
+    parser.add_argument("--height", type=int, default=340)
+    parser.add_argument("--json", type=str, help="Write results as JSON to this file")
+    return parser
+
+
+def main():
+    args = create_parser().parse_args()
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "numpy": np.__version__,
+        "options": {k: v for k, v in vars(args).items() if k != "json"},
+        "results": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="detector_bench_") as tmp:
+        for width, height in args.sizes:
+            folder = os.path.join(tmp, f"input_{width}x{height}")
+            output = os.path.join(tmp, f"output_{width}x{height}")
+            os.makedirs(folder)
+            images = [make_image(width, height, seed=i) for i in range(args.images)]
+            for i, image in enumerate(images):
+                image.save(os.path.join(folder, f"bench_{i:03d}.png"))
+
+            detector = StubDetector(output=output, width=args.width, height=args.height)
+            rows = bench_stages(detector, images, args)
+            rows.append(bench_flow(folder, output, args))
+            print(f"\n== {width}x{height} ({args.images} images x {args.repeat}) ==")
+            print(f"{'stage':<22}{'images/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'peak RSS MB':>13}")
+            for row in rows:
+                rss = f"{row['peak_rss_mb']:.1f}" if row["peak_rss_mb"] is not None else "-"
+                print(f"{row['stage']:<22}{row['images_per_s']:>10.2f}{row['p50_ms']:>10.2f}{row['p99_ms']:>10.2f}{rss:>13}")
+                report["results"].append({"size": [width, height], **row})
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+        print(f"\nResults saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
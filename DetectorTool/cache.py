@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """計算檔案內容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def image_digest(image):
+    """計算已載入影像像素內容的 SHA-256（含 mode 與尺寸）"""
+    digest = hashlib.sha256(f"{image.mode}:{image.width}x{image.height}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class DetectionCache:
+    """
+    以「影像內容雜湊 + 模型名稱」為 key 的偵測結果快取（SQLite）。
+    - 儲存原始的 (bbox, label, score) 列表，只改後處理參數時可完全跳過推論。
+    - 超過 max_bytes 時依最後存取時間淘汰（LRU）。
+    - 多個行程可共用同一個檔案（WAL 模式）。
+    - 命中時的存取時間先暫存在記憶體，於 put / 淘汰 / close 或累積 FLUSH_EVERY 筆時一次寫入，
+      全部命中時各行程也不會逐筆排隊等寫入鎖。
+    """
+
+    EVICT_EVERY = 64
+    FLUSH_EVERY = 256
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._accessed = {}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS detections ("
+            " digest TEXT NOT NULL,"
+            " model TEXT NOT NULL,"
+            " result TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " accessed REAL NOT NULL,"
+            " PRIMARY KEY (digest, model))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS detections_accessed ON detections (accessed)")
+        self.conn.commit()
+
+    @staticmethod
+    def encode(result):
+        return json.dumps([[list(bbox), label, score] for bbox, label, score in result])
+
+    @staticmethod
+    def decode(text):
+        return [(tuple(bbox), label, score) for bbox, label, score in json.loads(text)]
+
+    def get(self, digest, model):
+        """命中時回傳偵測結果（可能是空列表），未命中回傳 None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT result FROM detections WHERE digest = ? AND model = ?", (digest, model)
+            ).fetchone()
+            if row is None:
+                return None
+            self._accessed[(digest, model)] = time.time()
+            if len(self._accessed) >= self.FLUSH_EVERY:
+                self._flush_accessed()
+                self.conn.commit()
+        return self.decode(row[0])
+
+    def flush(self):
+        """寫入暫存的存取時間；不會 close 的快取（例如 worker 行程）需定期呼叫"""
+        with self._lock:
+            self._flush_accessed()
+            self.conn.commit()
+
+    def _flush_accessed(self):
+        """把暫存的存取時間寫入（由呼叫端 commit）"""
+        if self._accessed:
+            self.conn.executemany(
+                "UPDATE detections SET accessed = ? WHERE digest = ? AND model = ?",
+                [(accessed, digest, model) for (digest, model), accessed in self._accessed.items()],
+            )
+            self._accessed = {}
+
+    def put(self, digest, model, result):
+        text = self.encode(result)
+        with self._lock:
+            self._flush_accessed()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO detections (digest, model, result, size, accessed) VALUES (?, ?, ?, ?, ?)",
+                (digest, model, text, len(text) + len(digest) + len(model), time.time()),
+            )
+            self.conn.commit()
+            self._puts += 1
+            if self._puts >= self.EVICT_EVERY:
+                self._evict()
+
+    def total_bytes(self):
+        with self._lock:
+            return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM detections").fetchone()[0]
+
+    def evict(self):
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        self._puts = 0
+        self._flush_accessed()
+        self.conn.commit()
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM detections").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for digest, model, size in self.conn.execute(
+            "SELECT digest, model, size FROM detections ORDER BY accessed"
+        ):
+            if total <= self.max_bytes:
+                break
+            stale.append((digest, model))
+            total -= size
+        self.conn.executemany("DELETE FROM detections WHERE digest = ? AND model = ?", stale)
+        self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._evict()
+            self.conn.close()
@@ -1,92 +1,380 @@
 import argparse
 import glob, os, sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 
 from .HeadDetector import HeadDetector
 from .CensorDetector import CensorDetector
+from .pipeline import StagedPipeline
+from .cache import DetectionCache
+from .incremental import RunManifest
+from .manifest import DetectionManifest
+from .postprocess import PostProcessor
+from .profiling import Profiler
 
-#..\..\python_embeded\python.exe .\py\detector.py --mode head -f "E:\code\dev\AI\productions\games\ero\piexl\Galahad\release\01" -o .\out2 --mask --blur_size 32  
-#..\..\python_embeded\python.exe .\py\detector.py --mode censor -f "E:\code\dev\AI\productions\games\ero\piexl\Galahad\release\01" --filter penis -o .\out3 --mask --blur_size 32
-if __name__ == "__main__":
+
+DEFAULT_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'anime_head_detector', 'detections.sqlite')
+
+
+def create_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--mode', choices=['head', 'censor'], required=True)
+    add_detector_arguments(parser)
     parser.add_argument('-f', '--folder', default='.', help='Input folder containing PNG images')
+    parser.add_argument('-d', '--dry_run', action='store_true')
+    # [新增] --workers 參數：以多個行程平行處理圖片
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes')
+    # [新增] 讀取 / 推論 / 寫出 三段式管線
+    parser.add_argument('--pipeline', action='store_true', help='Overlap decode, inference and PNG encode in a staged pipeline')
+    parser.add_argument('--readers', type=int, default=2, help='Reader threads for --pipeline')
+    parser.add_argument('--writers', type=int, default=2, help='Writer threads for --pipeline')
+    parser.add_argument('--queue_size', type=int, default=8, help='Bounded queue size between pipeline stages')
+    # [新增] 增量模式：依輸出資料夾中的執行紀錄只處理新增 / 變更的圖片
+    parser.add_argument('--incremental', action='store_true', help='Only process new or changed images (manifest in output folder)')
+    # [新增] 分階段計時：輸出摘要表與 Chrome trace
+    parser.add_argument('--profile', action='store_true', help='Print per-stage timings and write a Chrome trace')
+    parser.add_argument('--profile_trace', type=str, default=None, help='Trace file path (default: <output>/profile_trace.json)')
+    return parser
+
+
+# [新增] 偵測與輸出相關的參數，供 detector.py 與 video_detector.py 共用
+def add_detector_arguments(parser):
+    parser.add_argument('--mode', choices=['head', 'censor'], required=True)
     parser.add_argument('-o', '--output', type=str, default='output')
     parser.add_argument('--width', type=int, default=260)
     parser.add_argument('--height', type=int, default=340)
     parser.add_argument('--resize', action='store_true')
     parser.add_argument('--bg', type=str, default=None, help='Background image for cropping')
     parser.add_argument('--filter', type=str, help='Censor filter label')
-    parser.add_argument('-d', '--dry_run', action='store_true')
     parser.add_argument('--force_rect_crop', action='store_true')
     parser.add_argument('-m', '--mask', action='store_true')
     parser.add_argument('-b', '--blur_size', type=int, default=10)
     parser.add_argument('--info', action='store_true')
+    # [新增] RectInfo 輸出格式：json 為每個偵測一個檔案，jsonl 為輸出資料夾中的單一 detections.jsonl
+    parser.add_argument('--info_format', choices=['json', 'jsonl'], default='json', help='Write one JSON file per detection or append to <output>/detections.jsonl')
+    # [新增] 遮罩輸出格式：full 為原圖大小，compact 只涵蓋裁切區域（偏移量記錄在 JSON）
+    parser.add_argument('--mask_layout', choices=['full', 'compact'], default='full', help='Save full-canvas masks or masks cropped to the crop region')
     # [新增] --top_n 參數
     parser.add_argument('--top_n', type=int, default=3, help='Number of detections to process')
-    args = parser.parse_args()
+    # [新增] 偵測結果後處理：NMS 去除重疊的重複偵測，可選擇合併重疊框與分數下限
+    parser.add_argument('--nms_iou', type=float, default=None, help='IoU threshold for suppressing overlapping detections (default: off)')
+    parser.add_argument('--nms_class_agnostic', action='store_true', help='Let detections of different labels suppress each other (requires --nms_iou)')
+    parser.add_argument('--merge_boxes', choices=['union', 'weighted'], default=None, help='Merge suppressed boxes into the kept box instead of dropping them (requires --nms_iou)')
+    parser.add_argument('--min_score', type=float, default=None, help='Drop detections scoring below this value')
+    # [新增] 分塊偵測：超大圖切成重疊的分塊分別偵測，小的頭部不會因整張縮小而漏掉
+    parser.add_argument('--tile_size', type=int, default=None, help='Detect on overlapping tiles of this size in pixels (default: whole image)')
+    parser.add_argument('--tile_overlap', type=int, default=128, help='Overlap between neighbouring tiles in pixels')
+    # [新增] --batch_size 參數：多張影像合併為一次推論
+    parser.add_argument('--batch_size', type=int, default=1, help='Number of images per detection batch')
+    # [新增] 偵測結果快取：只改後處理參數重跑時可跳過推論
+    parser.add_argument('--cache', type=str, default=DEFAULT_CACHE, help='Detection cache file (SQLite)')
+    parser.add_argument('--cache_size', type=int, default=256, help='Detection cache size limit in MB (LRU eviction)')
+    parser.add_argument('--no_cache', '--no-cache', dest='no_cache', action='store_true', help='Disable the detection cache')
+    return parser
+
+
+# [新增] add_detector_arguments 參數之間的檢查，供 detector.py 與 video_detector.py 共用
+def validate_args(parser, args):
+    if args.tile_size and not 0 <= args.tile_overlap < args.tile_size:
+        parser.error("--tile_overlap must be smaller than --tile_size.")
+    if (args.merge_boxes or args.nms_class_agnostic) and args.nms_iou is None:
+        parser.error("--merge_boxes and --nms_class_agnostic require --nms_iou.")
+
+
+# 會影響輸出結果的參數；增量模式下任一項改變都會重新處理
+OUTPUT_OPTIONS = (
+    'mode', 'width', 'height', 'resize', 'bg', 'filter', 'force_rect_crop',
+    'mask', 'blur_size', 'info', 'top_n', 'mask_layout', 'info_format',
+    'nms_iou', 'nms_class_agnostic', 'merge_boxes', 'min_score', 'tile_size', 'tile_overlap',
+)
 
-    folder = args.folder
-    width = args.width
-    height = args.height
-    output = args.output
 
+def output_options(args):
+    return {name: getattr(args, name) for name in OUTPUT_OPTIONS}
+
+
+def create_detector(args):
     if args.mode == 'head':
-        detector = HeadDetector(output=output, width=width, height=height)
-        for img_path in glob.glob(os.path.join(folder, '*.png')):
-            img_path = img_path.replace("PNG", "png")
-            mask_name = os.path.basename(img_path).replace('.png', '_mask.png')
-            info_name = os.path.basename(img_path).replace('.png', '.json')
-            if args.dry_run:
-                print(f"Would process: {img_path}")
-                print(f"Would save mask to: {os.path.join(output, mask_name)}")
+        detector = HeadDetector(output=args.output, width=args.width, height=args.height)
+    else:
+        detector = CensorDetector(output=args.output, width=args.width, height=args.height)
+    if not args.no_cache and args.cache:
+        detector.cache = DetectionCache(args.cache, max_bytes=args.cache_size * 1024 * 1024)
+    detector.postprocessor = create_postprocessor(args)
+    detector.tile_size = args.tile_size
+    detector.tile_overlap = args.tile_overlap
+    return detector
+
+
+def create_postprocessor(args):
+    if args.nms_iou is None and args.min_score is None:
+        return None
+    return PostProcessor(
+        iou_threshold=args.nms_iou,
+        min_score=args.min_score,
+        class_aware=not args.nms_class_agnostic,
+        merge=args.merge_boxes,
+    )
+
+
+def create_manifest(args):
+    """--info_format jsonl 時開啟輸出資料夾的 DetectionManifest（只在主行程呼叫）"""
+    if args.info and args.info_format == 'jsonl' and not getattr(args, 'dry_run', False):
+        return DetectionManifest(args.output)
+    return None
+
+
+def list_images(folder):
+    return [img_path.replace("PNG", "png") for img_path in glob.glob(os.path.join(folder, '*.png'))]
+
+
+def save_masks(detector, args, image, bboxes, frame=None):
+    # [修改] mask 模式改用迴圈處理多個 bbox
+    # [修改] frame 為 (畫面編號, 時間) 時記錄到 RectInfo（影片來源）
+    outputs = []
+    for idx, bbox in enumerate(bboxes, start=1):
+        masked, mask, info = detector.create_blurred_mask(
+            image, bbox, args.blur_size, index=idx, compact=args.mask_layout == 'compact'
+        )
+        if frame is not None:
+            info.frame_index, info.timestamp = frame
+        if mask is not None:
+            detector.Crop(image, info.origin_rect.to_tuple(), info.rect_filename)
+            outputs.append(detector.output_path(info.rect_filename))
+            outputs.append(detector.save_image(mask, info.mask_name))
+            if args.info and detector.manifest is not None:
+                detector.manifest.append(info.to_dict())
+            elif args.info:
+                info_path = os.path.join(args.output, f'{info.filename}.json')
+                info.save_to_file(info_path)
+                outputs.append(info_path)
+    return outputs
+
+
+def process_image(detector, args, img_path, image=None, result=None, frame=None):
+    """
+    處理單張圖片；image / result 可由呼叫端預先載入或批次偵測後傳入，回傳寫出的檔案列表
+    frame: 影片畫面的 (畫面編號, 時間)，會寫入 RectInfo
+    """
+    # 每張圖只解碼一次，之後偵測 / 遮罩 / 裁切都共用同一份影像
+    if image is None:
+        image = detector.load_image(img_path)
+    if result is None:
+        result = detector.detect_cached(image)
+
+    outputs = []
+    if args.mode == 'head':
+        if args.force_rect_crop:
+            cropped, name = detector.force_rect_crop(image, result, args.width, args.width, args.resize, args.bg)
+            if cropped:
+                outputs.append(detector.save_image(cropped, name))
+            print(result)
+        elif args.mask:
+            bboxes = detector.get_top_rects(result, top_n=args.top_n)
+            outputs.extend(save_masks(detector, args, image, bboxes, frame))
+        else:
+            cropped, name, bbox = detector.crop(image, result)
+            if cropped:
+                outputs.append(detector.save_image(cropped, name))
+            print(result)
+    else:
+        bbox = detector.get_best_rect(result, filter_label=args.filter)
+        if bbox:
+            if args.force_rect_crop:
+                cropped, name = detector.force_rect_crop(image, result, args.width, args.height)
+                outputs.append(detector.save_image(cropped, name))
+            elif args.mask:
+                bboxes = detector.get_top_rects(result, filter_label=args.filter, top_n=args.top_n)
+                outputs.extend(save_masks(detector, args, image, bboxes, frame))
             else:
-                if args.force_rect_crop:
-                    detector.DetectAndForceRectCrop(img_path, width, resize=args.resize, bg_path=args.bg)
-                # [修改] mask 模式改用迴圈處理多個 bbox
-                elif args.mask:
-                    result = detector.detect(img_path)
-                    bboxes = detector.get_top_rects(result, top_n=args.top_n if hasattr(args, 'top_n') else 3)
-                    for idx, bbox in enumerate(bboxes, start=1):
-                        masked, mask, info = detector.create_blurred_mask(img_path, bbox, args.blur_size, index=idx)
-                        if mask is not None:
-                            detector.Crop(img_path, info.origin_rect.to_tuple(), info.rect_filename)
-                            detector.save_image(mask, info.mask_name)
-                            if args.info:
-                                info.save_to_file(os.path.join(output, f'{info.filename}.json'))
+                cropped, name, bbox = detector.crop(image, result)
+                outputs.append(detector.save_image(cropped, name))
+        else:
+            print(f"No censor region found for filter '{args.filter}' in {img_path}")
+    return outputs
+
+
+def _ignore(img_path, outputs):
+    pass
+
+
+def run_sequential(detector, args, img_paths, on_done=_ignore):
+    for img_path in img_paths:
+        on_done(img_path, process_image(detector, args, img_path))
+
+
+def run_batched(detector, args, img_paths, on_done=_ignore):
+    """每 batch_size 張圖片解碼後一次送進 detect_batch，再逐張後處理"""
+    for start in range(0, len(img_paths), args.batch_size):
+        chunk = img_paths[start:start + args.batch_size]
+        images = [detector.load_image(img_path) for img_path in chunk]
+        results = detector.detect_batch(images, batch_size=args.batch_size)
+        for img_path, image, result in zip(chunk, images, results):
+            on_done(img_path, process_image(detector, args, img_path, image, result))
+
+
+# [新增] 多行程模式：每個 worker 在 initializer 中建立偵測器並載入模型一次
+_worker_detector = None
+_worker_args = None
+
+
+def _init_worker(args):
+    global _worker_detector, _worker_args
+    _worker_args = args
+    _worker_detector = create_detector(args)
+    # jsonl 紀錄先暫存在 worker，隨結果傳回主行程寫入
+    if args.info and args.info_format == 'jsonl':
+        _worker_detector.manifest = []
+    _worker_detector.warmup()
+
+
+def _run_worker_chunk(img_paths):
+    """在 worker 中處理一組圖片，回傳 [(img_path, outputs, error, records), ...]"""
+    detector, args = _worker_detector, _worker_args
+    try:
+        images = [detector.load_image(img_path) for img_path in img_paths]
+        if len(images) > 1:
+            results = detector.detect_batch(images, batch_size=len(images))
+        else:
+            results = [detector.detect_cached(image) for image in images]
+    except Exception:
+        return [(img_path, [], traceback.format_exc(), []) for img_path in img_paths]
+    finally:
+        # worker 的快取不會被 close，命中的存取時間在每組結束時寫入，LRU 才看得到
+        if detector.cache is not None:
+            detector.cache.flush()
+
+    processed = []
+    for img_path, image, result in zip(img_paths, images, results):
+        try:
+            outputs = process_image(detector, args, img_path, image, result)
+            error = None
+        except Exception:
+            outputs, error = [], traceback.format_exc()
+        records = list(detector.manifest or [])
+        if detector.manifest:
+            detector.manifest.clear()
+        processed.append((img_path, outputs, error, records))
+    return processed
+
+
+def run_parallel(args, img_paths, on_done=_ignore, manifest=None):
+    """以 ProcessPoolExecutor 平行處理；結果、錯誤與 jsonl 紀錄統一在主行程彙整"""
+    chunk_size = max(1, args.batch_size)
+    chunks = [img_paths[start:start + chunk_size] for start in range(0, len(img_paths), chunk_size)]
+    errors = {}
+    output_count = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(args,)) as executor:
+        futures = [executor.submit(_run_worker_chunk, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            for img_path, outputs, error, records in future.result():
+                output_count += len(outputs)
+                if manifest is not None:
+                    for record in records:
+                        manifest.append(record)
+                if error:
+                    errors[img_path] = error
                 else:
-                    _, img, bbox = detector.DetectAndCrop(img_path)
-    elif args.mode == 'censor':
-        if not args.filter:
-            print("Please specify --filter for censor mode.")
-            sys.exit(1)
-        detector = CensorDetector(output=output, width=width, height=height)
-        for img_path in glob.glob(os.path.join(folder, '*.png')):
-            img_path = img_path.replace("PNG", "png")
-            mask_name = os.path.basename(img_path).replace('.png', f'_{args.filter}_mask.png')
-            info_name = os.path.basename(img_path).replace('.png', f'_{args.filter}.json')
-            if args.dry_run:
+                    on_done(img_path, outputs)
+    print(f"Processed {len(img_paths) - len(errors)}/{len(img_paths)} images, {output_count} files written")
+    for img_path in sorted(errors):
+        print(f"Failed: {img_path}\n{errors[img_path]}")
+    return errors
+
+
+def run_pipeline(detector, args, img_paths, on_done=_ignore):
+    """reader 執行緒解碼、單一執行緒推論、writer 執行緒做遮罩 / 裁切 / PNG 編碼"""
+    def read(img_path):
+        image = detector.load_image(img_path)
+        image.load()
+        return image
+
+    def infer(images):
+        if len(images) > 1:
+            return detector.detect_batch(images, batch_size=len(images))
+        return [detector.detect_cached(image) for image in images]
+
+    def write(img_path, image, result):
+        outputs = process_image(detector, args, img_path, image, result)
+        on_done(img_path, outputs)
+        return outputs
+
+    pipeline = StagedPipeline(
+        read, infer, write,
+        readers=args.readers, writers=args.writers,
+        queue_size=args.queue_size, batch_size=args.batch_size,
+    )
+    results, errors = pipeline.run(img_paths)
+    pipeline.print_stats()
+    for img_path in sorted(errors):
+        print(f"Failed: {img_path}\n{errors[img_path]}")
+    return errors
+
+
+#..\..\python_embeded\python.exe .\py\detector.py --mode head -f "E:\code\dev\AI\productions\games\ero\piexl\Galahad\release\01" -o .\out2 --mask --blur_size 32
+#..\..\python_embeded\python.exe .\py\detector.py --mode censor -f "E:\code\dev\AI\productions\games\ero\piexl\Galahad\release\01" --filter penis -o .\out3 --mask --blur_size 32
+def main():
+    parser = create_parser()
+    args = parser.parse_args()
+    validate_args(parser, args)
+
+    if args.mode == 'censor' and not args.filter:
+        print("Please specify --filter for censor mode.")
+        sys.exit(1)
+
+    detector = create_detector(args)
+    detector.manifest = create_manifest(args)
+    img_paths = list_images(args.folder)
+
+    manifest = None
+    on_done = _ignore
+    if args.incremental:
+        manifest = RunManifest(args.output, output_options(args))
+        img_paths, skipped = manifest.plan(img_paths)
+        print(f"Incremental: {len(img_paths)} to process, {len(skipped)} up to date")
+        if not args.dry_run:
+            removed = manifest.remove_missing(args.folder, img_paths + skipped)
+            if removed:
+                print(f"Incremental: removed outputs of {removed} deleted inputs")
+            on_done = manifest.record
+
+    profiler = None
+    if args.profile:
+        if args.workers > 1:
+            print("--profile only instruments the main process; worker processes are not profiled")
+        profiler = Profiler()
+        profiler.instrument(detector)
+
+    errors = {}
+    try:
+        if args.dry_run:
+            for img_path in img_paths:
+                suffix = f'_{args.filter}' if args.mode == 'censor' else ''
+                mask_name = os.path.basename(img_path).replace('.png', f'{suffix}_mask.png')
                 print(f"Would process: {img_path}")
-                print(f"Would save mask to: {os.path.join(output, mask_name)}")
-            else:
-                best = detector.detect(img_path)
-                bbox = detector.get_best_rect(best, filter_label=args.filter)
-                if bbox:
-                    if args.force_rect_crop:
-                        cropped, image = detector.force_rect_crop(img_path, best, width, height)
-                        detector.save_image(cropped, image)
-                    # [修改] mask 模式改用迴圈處理多個 bbox
-                    elif args.mask:
-                        bboxes = detector.get_top_rects(best, filter_label=args.filter, top_n=args.top_n if hasattr(args, 'top_n') else 3)
-                        for idx, bbox in enumerate(bboxes, start=1):
-                            masked, mask, info = detector.create_blurred_mask(img_path, bbox, args.blur_size, index=idx)
-                            if mask is not None:
-                                detector.Crop(img_path, info.origin_rect.to_tuple(), info.rect_filename)
-                                detector.save_image(mask, info.mask_name)
-                                if args.info:
-                                    info.save_to_file(os.path.join(output, f'{info.filename}.json'))
-                    else:
-                        cropped, image, bbox = detector.crop(img_path, best)
-                        detector.save_image(cropped, image)
-                else:
-                    print(f"No censor region found for filter '{args.filter}' in {img_path}")
\ No newline at end of file
+                print(f"Would save mask to: {os.path.join(args.output, mask_name)}")
+        elif args.workers > 1:
+            errors = run_parallel(args, img_paths, on_done, detector.manifest)
+        elif args.pipeline:
+            errors = run_pipeline(detector, args, img_paths, on_done)
+        elif args.batch_size > 1:
+            run_batched(detector, args, img_paths, on_done)
+        else:
+            run_sequential(detector, args, img_paths, on_done)
+    finally:
+        if profiler is not None:
+            print(profiler.summary())
+            trace_path = args.profile_trace or os.path.join(args.output, 'profile_trace.json')
+            profiler.save_trace(trace_path)
+            print(f"Trace saved to {trace_path}")
+        if manifest is not None and not args.dry_run:
+            manifest.save()
+        if detector.cache is not None:
+            detector.cache.close()
+        if detector.manifest is not None:
+            detector.manifest.close()
+    if errors:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
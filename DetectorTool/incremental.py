@@ -0,0 +1,116 @@
+import json
+import os
+import threading
+
+from .cache import file_digest
+
+
+class RunManifest:
+    """
+    輸出資料夾中的執行紀錄（.detector_manifest.json），供增量 / 續跑使用。
+    - 每個輸入記錄 path / mtime / size / hash、使用的參數與產生的輸出檔。
+    - 輸入未變且參數相同、輸出檔都還在時跳過；輸入已刪除時一併清掉其輸出。
+    """
+
+    FILENAME = ".detector_manifest.json"
+    SAVE_EVERY = 50
+
+    def __init__(self, output, options):
+        self.output = output
+        self.path = os.path.join(output, self.FILENAME)
+        self.options = options
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._dirty = 0
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f).get("inputs", {})
+            except (OSError, ValueError) as e:
+                print(f"無法讀取執行紀錄，將全部重新處理: {e}")
+
+    @staticmethod
+    def key(img_path):
+        return os.path.normcase(os.path.abspath(img_path))
+
+    def is_current(self, img_path):
+        """輸入內容與參數都和上次相同，且上次的輸出檔仍存在"""
+        entry = self.entries.get(self.key(img_path))
+        if entry is None or entry.get("options") != self.options:
+            return False
+        stat = os.stat(img_path)
+        if entry["size"] != stat.st_size:
+            return False
+        if entry["mtime"] != stat.st_mtime:
+            if entry["hash"] != file_digest(img_path):
+                return False
+            # 內容沒變（例如只是被 touch / 複製），記下新的 mtime，下次不必再算 hash
+            with self._lock:
+                entry["mtime"] = stat.st_mtime
+                self._dirty += 1
+        return all(os.path.exists(os.path.join(self.output, name)) for name in entry["outputs"])
+
+    def plan(self, img_paths):
+        """回傳 (需要處理的圖片, 可跳過的圖片)"""
+        todo, skipped = [], []
+        for img_path in img_paths:
+            (skipped if self.is_current(img_path) else todo).append(img_path)
+        return todo, skipped
+
+    def remove_missing(self, folder, img_paths):
+        """
+        刪除輸入資料夾 folder 中已不存在的圖片所產生的輸出，回傳清除的輸入數量
+        folder 為本次掃描的資料夾（而非由 img_paths 推得），圖片全被刪除時也能清除
+        """
+        folder = self.key(folder)
+        current = {self.key(img_path) for img_path in img_paths}
+        removed = 0
+        with self._lock:
+            for key in list(self.entries):
+                if key in current or os.path.dirname(key) != folder or os.path.exists(key):
+                    continue
+                self._delete_outputs(self.entries.pop(key)["outputs"])
+                removed += 1
+            self._dirty += removed
+        return removed
+
+    def record(self, img_path, outputs):
+        """記錄處理完成的圖片；上次有、這次沒產生的輸出檔會被刪除"""
+        stat = os.stat(img_path)
+        names = [os.path.relpath(path, self.output) for path in outputs]
+        entry = {
+            "path": img_path,
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "hash": file_digest(img_path),
+            "options": self.options,
+            "outputs": names,
+        }
+        with self._lock:
+            previous = self.entries.get(self.key(img_path))
+            if previous:
+                self._delete_outputs(set(previous["outputs"]) - set(names))
+            self.entries[self.key(img_path)] = entry
+            self._dirty += 1
+            if self._dirty >= self.SAVE_EVERY:
+                self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        self._dirty = 0
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"inputs": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _delete_outputs(self, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.output, name))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"無法刪除過期輸出 {name}: {e}")
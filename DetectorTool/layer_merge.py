@@ -1,19 +1,106 @@
 import argparse
+import contextlib
+import io
 import os
 import json
 import sys
 import re
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
-from typing import Dict, List, Set
+from typing import Dict, List
+
+
+# [新增] detector.py --info_format jsonl 的輸出檔名（與 DetectorTool.manifest.DetectionManifest.FILENAME 相同）
+MANIFEST_NAME = 'detections.jsonl'
+
+
+def read_layer_manifest(layer_path: str) -> Dict[str, Dict]:
+    """
+    讀取圖層資料夾中的 detections.jsonl，回傳 filename -> config（同一 filename 以最後一筆為準）
+    裁切圖已不存在的紀錄（增量模式刪除的過期輸出）會略過
+    """
+    manifest_path = os.path.join(layer_path, MANIFEST_NAME)
+    records = {}
+    if not os.path.exists(manifest_path):
+        return records
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                records[record['filename']] = record
+            except (ValueError, KeyError):
+                # 中斷時可能留下不完整的最後一行
+                continue
+    return {
+        filename: record for filename, record in records.items()
+        if os.path.exists(os.path.join(layer_path, f"{record.get('rect_filename', filename)}.png"))
+    }
+
+
+# [新增] 行程池 worker：ImageProcessor 只在 initializer 傳送一次，每個任務的輸出另外收集
+_worker_processor = None
+
+
+def _init_worker(processor):
+    global _worker_processor
+    _worker_processor = processor
+
+
+def _run_captured(method_name, args):
+    """在 worker 中執行 ImageProcessor 的方法，回傳 (結果, 輸出文字)"""
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        try:
+            result = getattr(_worker_processor, method_name)(*args)
+        except Exception as e:
+            print(f"    處理時發生錯誤: {e}")
+            result = False
+    return result, buffer.getvalue()
 
 
 class ImageProcessor:
-    def __init__(self, input_dir: str, layers: List[str], output_dir: str, verbose: bool = False):
+    # [修改] 增加 workers 參數：> 1 時以行程池平行處理圖層圖片與合成
+    def __init__(self, input_dir: str, layers: List[str], output_dir: str, verbose: bool = False, workers: int = 1):
         self.input_dir = input_dir
         self.layers = layers
         self.output_dir = output_dir
         self.verbose = verbose
+        self.workers = workers
+        self._pool = None
         self.folder_structure = self._analyze_folder_structure()
+    
+    def __getstate__(self):
+        # 行程池不傳給 worker
+        state = self.__dict__.copy()
+        state['_pool'] = None
+        return state
+    
+    def _map(self, method_name: str, arg_list: List[tuple]):
+        """依任務順序產生每個任務的結果；workers > 1 時在行程池中執行，
+        各任務的輸出依任務順序整段印出，結果與單行程相同"""
+        if self.workers <= 1 or len(arg_list) <= 1:
+            for args in arg_list:
+                yield getattr(self, method_name)(*args)
+            return
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker, initargs=(self,)
+            )
+        futures = [self._pool.submit(_run_captured, method_name, args) for args in arg_list]
+        for future in futures:
+            try:
+                result, output = future.result()
+            except Exception as e:
+                # worker 行程異常結束等情況，視為該任務失敗
+                result, output = False, f"    工作行程錯誤: {e}\n"
+            if output:
+                print(output, end='')
+            yield result
+    
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
         
     def _analyze_folder_structure(self) -> Dict:
         """自動分析資料夾結構，識別 origin 和各種 layer 資料夾"""
@@ -59,6 +146,10 @@ class ImageProcessor:
         # 匹配結尾的 _\d+ 模式
         match = re.match(r'^(.+)_(\d+)$', base_filename)
         if match:
+            # [修改] 去掉後綴後不是原始圖片、但完整名稱是時（例如沒有 index 的 'img_1'），使用完整名稱
+            available = self.folder_structure['available_images']
+            if match.group(1) not in available and base_filename in available:
+                return base_filename
             return match.group(1)
         return base_filename
     
@@ -70,30 +161,45 @@ class ImageProcessor:
             return {}
             
         mapping = {}  # original_base_name -> list of configs
+        
+        def add(config, config_path):
+            # [修改] 提取原始圖片名稱
+            raw_base_name = config['base_filename']
+            original_base_name = self._extract_original_base_name(raw_base_name)
+            
+            if original_base_name not in mapping:
+                mapping[original_base_name] = []
+            mapping[original_base_name].append({
+                'config': config,
+                'config_path': config_path,
+                'layer_path': layer_path
+            })
+        
+        # [新增] 先讀取 detections.jsonl（一次讀完），已在其中的偵測不再開啟個別 JSON 檔
+        records = read_layer_manifest(layer_path)
+        manifest_path = os.path.join(layer_path, MANIFEST_NAME)
+        for record in records.values():
+            add(record, manifest_path)
+        
         for file in os.listdir(layer_path):
-            if file.endswith('.json'):
+            if file.endswith('.json') and file[:-len('.json')] not in records:
                 config_path = os.path.join(layer_path, file)
                 try:
                     with open(config_path, 'r', encoding='utf-8') as f:
                         config = json.load(f)
-                    # [修改] 提取原始圖片名稱
-                    raw_base_name = config['base_filename']
-                    original_base_name = self._extract_original_base_name(raw_base_name)
-                    
-                    if original_base_name not in mapping:
-                        mapping[original_base_name] = []
-                    mapping[original_base_name].append({
-                        'config': config,
-                        'config_path': config_path,
-                        'layer_path': layer_path
-                    })
+                    add(config, config_path)
                 except Exception as e:
                     print(f"讀取配置檔案錯誤 {file}: {e}")
+        
+        # [新增] 同一張圖片的多個結果依檔名排序，處理與合成順序固定
+        for mapping_list in mapping.values():
+            mapping_list.sort(key=lambda m: m['config']['filename'])
                     
         return mapping
     
-    def process_all_layers(self) -> Dict[str, Set[str]]:
-        """第一階段：處理所有指定的 layers 並儲存到各自資料夾"""
+    # [修改] 回傳每個圖層寫出的檔案：原始圖片名稱 -> 依序排列的 *_processed.png 檔名
+    def process_all_layers(self) -> Dict[str, Dict[str, List[str]]]:
+        """輸出各圖層的 *_processed.png（--no-merge / --save-intermediate）；合成由 merge_layers_fused 負責"""
         print(f"處理圖層: {self.layers}")
         print(f"可用圖片: {len(self.folder_structure['available_images'])} 張")
         
@@ -105,7 +211,7 @@ class ImageProcessor:
             
             if not layer_mapping:
                 print(f"圖層 '{layer}' 沒有找到圖片")
-                processed_layers[layer] = set()
+                processed_layers[layer] = {}
                 continue
                 
             # 顯示覆蓋情況
@@ -122,12 +228,14 @@ class ImageProcessor:
         return processed_layers
     
     # [修改] 雙層迴圈處理每個結果
-    def _process_layer(self, layer_name: str, layer_mapping: Dict) -> Set[str]:
-        """處理單一 layer"""
+    # [修改] 先收集任務再以 _map 執行（可平行），失敗的項目在最後列出
+    def _process_layer(self, layer_name: str, layer_mapping: Dict) -> Dict[str, List[str]]:
+        """處理單一 layer，回傳 原始圖片名稱 -> 成功輸出的檔名列表"""
         output_layer_dir = os.path.join(self.output_dir, layer_name)
         os.makedirs(output_layer_dir, exist_ok=True)
         
-        processed_images = set()
+        processed_images = {}
+        tasks = []
         
         for base_name, mapping_list in layer_mapping.items():  # 現在是 list
             for mapping_info in mapping_list:  # 迴圈處理每個結果
@@ -140,18 +248,25 @@ class ImageProcessor:
                     print(f"  警告: 找不到原始圖片 {base_name}")
                     continue
                 
-                if self.verbose:
-                    print(f"  處理 {config['filename']}")
-                    
-                success = self._process_image_with_config(layer_path, config, output_layer_dir)
-                if success:
-                    processed_images.add(base_name)
+                tasks.append((base_name, config['filename'], (layer_path, config, output_layer_dir)))
+        
+        failures = []
+        results = self._map('_process_image_with_config', [task_args for _, _, task_args in tasks])
+        for (base_name, filename, _), success in zip(tasks, results):
+            if success:
+                processed_images.setdefault(base_name, []).append(f"{filename}_processed.png")
+            else:
+                failures.append(filename)
                 
         print(f"圖層 {layer_name} 處理完成: {len(processed_images)} 張圖片")
+        if failures:
+            print(f"  ❌ 失敗 {len(failures)} 個: {', '.join(failures)}")
         return processed_images
     
     def _process_image_with_config(self, layer_path: str, config: Dict, output_dir: str) -> bool:
         """根據 JSON 配置處理單一圖片"""
+        if self.verbose:
+            print(f"  處理 {config['filename']}")
         try:
             # 取得檔案路徑
             image_file = f"{config['filename']}.png"
@@ -188,6 +303,11 @@ class ImageProcessor:
             
             # 讀取 mask
             mask = Image.open(mask_path).convert("L")
+            # [新增] 精簡遮罩只涵蓋裁切區域，依偏移量還原為原圖大小
+            if config.get('mask_offset') is not None:
+                full_mask = Image.new("L", tuple(config['canvas_size']), 0)
+                full_mask.paste(mask, tuple(config['mask_offset']))
+                mask = full_mask
             mask_w, mask_h = mask.size
             
             # 建立與 mask 相同大小的透明底圖
@@ -214,83 +334,112 @@ class ImageProcessor:
             print(f"調整圖片時發生錯誤: {e}")
             raise
     
-    def merge_layers_for_all_images(self, processed_layers: Dict[str, Set[str]]):
-        """第二階段：為每張圖片進行圖層合成"""
-        print("\n=== 開始圖層合成 ===")
+    # [新增] 融合模式：不經過 *_processed.png，直接在記憶體中把各圖層貼回原圖
+    def merge_layers_fused(self):
+        """讀取各圖層的 JSON 配置，每張圖片只解碼原圖、修正圖與遮罩一次，
+        在 origin_rect 範圍內套用遮罩後直接 alpha 合成到原圖上"""
+        print("\n=== 開始圖層合成（融合模式）===")
         
-        # 建立合成輸出資料夾
         merged_output_dir = os.path.join(self.output_dir, 'merged')
         os.makedirs(merged_output_dir, exist_ok=True)
         
-        total_images = len(self.folder_structure['available_images'])
-        merged_count = 0
-        skipped_count = 0
+        # 每張圖片的 [(layer, layer_path, config), ...]，依圖層順序、同圖層依檔名排序（get_layer_image_mapping 已排序）
+        # get_layer_image_mapping 依原始圖片名稱分組，即為每張圖片的圖層索引，不需逐張掃描圖層資料夾
+        items_by_image = {base_name: [] for base_name in self.folder_structure['available_images']}
+        for layer in self.layers:
+            for base_name, mapping_list in self.get_layer_image_mapping(layer).items():
+                if base_name not in items_by_image:
+                    print(f"  警告: 找不到原始圖片 {base_name}")
+                    continue
+                for mapping_info in mapping_list:
+                    items_by_image[base_name].append((layer, mapping_info['layer_path'], mapping_info['config']))
         
-        for base_name in sorted(self.folder_structure['available_images']):
-            result = self._merge_layers_for_image(base_name, processed_layers, merged_output_dir)
+        total_images = len(items_by_image)
+        merged_count = 0
+        base_names = sorted(items_by_image)
+        tasks = [(base_name, items_by_image[base_name], merged_output_dir) for base_name in base_names]
+        for result in self._map('_merge_fused_image', tasks):
             if result:
                 merged_count += 1
-            else:
-                skipped_count += 1
-                
+        
         print(f"\n圖層合成完成:")
         print(f"  成功合成: {merged_count} 張")
-        print(f"  跳過: {skipped_count} 張")
+        print(f"  跳過: {total_images - merged_count} 張")
         print(f"  總計: {total_images} 張")
     
-    # [修改] 匹配 _1, _2, _3 等多個結果並合併
-    def _merge_layers_for_image(self, base_name: str, processed_layers: Dict[str, Set[str]], output_dir: str) -> bool:
-        """為單張圖片進行圖層合成"""
+    def _merge_fused_image(self, base_name: str, items: List[tuple], output_dir: str) -> bool:
+        """融合模式下合成單張圖片；單一圖層結果失敗時略過該結果並繼續"""
+        if not items:
+            print(f"  ⚠️ {base_name}: 沒有可用的圖層，跳過合成")
+            return False
         try:
-            # 1. 載入 origin 圖片作為底圖
             origin_filename = self.folder_structure['available_images'][base_name]
             origin_path = os.path.join(self.folder_structure['origin_path'], origin_filename)
             base_image = Image.open(origin_path).convert("RGBA")
-            base_w, base_h = base_image.size
-            
-            if self.verbose:
-                print(f"  合成 {base_name} (尺寸: {base_w}x{base_h})")
-            
-            # 2. 依序疊加 layer0, layer1, layer2 (按 self.layers 順序)
-            applied_layers = []
-            
-            for i, layer in enumerate(self.layers):
-                # 檢查該圖片是否有這個圖層
-                if base_name not in processed_layers.get(layer, set()):
-                    if self.verbose:
-                        print(f"    跳過 layer{i} ({layer}): 圖片沒有此圖層")
-                    continue
-                
-                # 找出所有處理過的檔案（包含 _1, _2, _3 等）
-                layer_output_dir = os.path.join(self.output_dir, layer)
-                pattern = f"{base_name}_"  # 匹配 base_name_ 開頭的檔案
-                
-                for file in os.listdir(layer_output_dir):
-                    if file.startswith(pattern) and file.endswith('_processed.png'):
-                        layer_image_path = os.path.join(layer_output_dir, file)
-                        layer_image = Image.open(layer_image_path).convert("RGBA")
-                        
-                        if layer_image.size != (base_w, base_h):
-                            layer_image = layer_image.resize((base_w, base_h), Image.Resampling.LANCZOS)
-                        
-                        base_image = Image.alpha_composite(base_image, layer_image)
-                        applied_layers.append(f"{layer}/{file}")
-            
-            # 3. 儲存最終合成結果
-            if applied_layers:
-                final_output = os.path.join(output_dir, f"{base_name}_merged.png")
-                base_image.save(final_output)
-                
-                layers_info = ', '.join(applied_layers)
-                print(f"  ✅ {base_name}: 套用圖層 [{layers_info}] → {base_name}_merged.png")
-                return True
-            else:
-                print(f"  ⚠️ {base_name}: 沒有可用的圖層，跳過合成")
-                return False
-            
         except Exception as e:
             print(f"  ❌ {base_name}: 合成失敗 - {e}")
             return False
+        
+        if self.verbose:
+            print(f"  合成 {base_name} (尺寸: {base_image.width}x{base_image.height})")
+        
+        applied_layers = []
+        for layer, layer_path, config in items:
+            try:
+                patch, position, canvas_size = self._build_layer_patch(layer_path, config)
+                if canvas_size == base_image.size:
+                    base_image.alpha_composite(patch, dest=position, source=(0, 0))
+                else:
+                    # 遮罩畫布與原圖尺寸不同時，與原流程相同：先組成完整圖層再縮放
+                    layer_image = Image.new("RGBA", canvas_size, (0, 0, 0, 0))
+                    layer_image.paste(patch, position)
+                    layer_image = layer_image.resize(base_image.size, Image.Resampling.LANCZOS)
+                    base_image = Image.alpha_composite(base_image, layer_image)
+                applied_layers.append(f"{layer}/{config['filename']}")
+            except Exception as e:
+                print(f"    ❌ {layer}/{config.get('filename', '?')}: {e}")
+        
+        if not applied_layers:
+            print(f"  ⚠️ {base_name}: 沒有可用的圖層，跳過合成")
+            return False
+        
+        base_image.save(os.path.join(output_dir, f"{base_name}_merged.png"))
+        layers_info = ', '.join(applied_layers)
+        print(f"  ✅ {base_name}: 套用圖層 [{layers_info}] → {base_name}_merged.png")
+        return True
+    
+    def _build_layer_patch(self, layer_path: str, config: Dict):
+        """回傳 (patch, 左上角座標, 遮罩畫布尺寸)：patch 為 origin_rect 大小、已縮放並套用遮罩的圖層。
+        與 _adjust_and_apply_mask 的結果在 origin_rect 內相同；遮罩在 origin_rect 外為 0，因此不需要完整畫布"""
+        image_path = os.path.join(layer_path, f"{config['filename']}.png")
+        mask_path = os.path.join(layer_path, f"{config['mask_name']}.png")
+        corrected_img = Image.open(image_path).convert("RGBA")
+        mask = Image.open(mask_path).convert("L")
+        
+        origin_rect = config['origin_rect']
+        x, y = origin_rect['x1'], origin_rect['y1']
+        w, h = origin_rect['width'], origin_rect['height']
+        
+        # 取出 origin_rect 範圍的遮罩（精簡遮罩需扣掉偏移量）
+        if config.get('mask_offset') is not None:
+            offset_x, offset_y = config['mask_offset']
+            canvas_size = tuple(config['canvas_size'])
+        else:
+            offset_x, offset_y = 0, 0
+            canvas_size = mask.size
+        region_mask = mask.crop((x - offset_x, y - offset_y, x - offset_x + w, y - offset_y + h))
+        
+        resized_img = corrected_img.resize((w, h), Image.Resampling.LANCZOS)
+        patch = Image.new("RGBA", (w, h), (0, 0, 0, 0))
+        patch.paste(resized_img, (0, 0), resized_img)
+        patch.putalpha(region_mask)
+        
+        # 超出畫布的部分裁掉（alpha_composite 的 dest 不能為負）
+        left, top = max(0, -x), max(0, -y)
+        right, bottom = min(w, canvas_size[0] - x), min(h, canvas_size[1] - y)
+        if (left, top, right, bottom) != (0, 0, w, h):
+            patch = patch.crop((left, top, right, bottom))
+        return patch, (x + left, y + top), canvas_size
 
 
 def parse_arguments():
@@ -366,6 +515,22 @@ def parse_arguments():
         help='僅處理圖層，不進行合成'
     )
     
+    # [新增] 合成預設直接在記憶體中進行；需要檢查中間結果時才寫出 *_processed.png
+    parser.add_argument(
+        '--save-intermediate',
+        action='store_true',
+        help='除錯用：另外輸出各圖層的 *_processed.png（--no-merge 時一定會輸出）'
+    )
+    
+    # [新增] 平行處理
+    parser.add_argument(
+        '--workers', '-w',
+        type=int,
+        default=1,
+        metavar='N',
+        help='平行處理的行程數（預設 1，不平行）'
+    )
+    
     # Windows 路徑修復
     try:
         args = parser.parse_args()
@@ -430,9 +595,10 @@ def validate_input_structure(input_dir: str, layers: List[str]) -> bool:
         layer_path = os.path.join(input_dir, layer)
         if os.path.exists(layer_path):
             available_layers.append(layer)
-            # 計算該 layer 的圖片數量
-            layer_configs = [f for f in os.listdir(layer_path) if f.endswith('.json')]
-            print(f"📁 {layer} 資料夾: {len(layer_configs)} 張圖片配置")
+            # 計算該 layer 的圖片數量（detections.jsonl 的紀錄 + 其餘個別 JSON 檔）
+            records = read_layer_manifest(layer_path)
+            layer_configs = [f for f in os.listdir(layer_path) if f.endswith('.json') and f[:-len('.json')] not in records]
+            print(f"📁 {layer} 資料夾: {len(layer_configs) + len(records)} 張圖片配置")
         else:
             missing_layers.append(layer)
             
@@ -498,18 +664,22 @@ def main():
             print(f"📁 建立輸出目錄: {args.output}")
         
         # 初始化處理器
-        processor = ImageProcessor(args.input, args.layers, args.output, args.verbose)
-        
-        # 第一階段：處理各圖層
-        print("\n=== 🎨 階段 1: 處理圖層 ===")
-        processed_layers = processor.process_all_layers()
+        processor = ImageProcessor(args.input, args.layers, args.output, args.verbose, args.workers)
         
-        if args.no_merge:
-            print("\n⏹️ 僅處理圖層模式，跳過合成")
-        else:
-            # 第二階段：圖層合成
-            print("\n=== 🔄 階段 2: 圖層合成 ===")
-            processor.merge_layers_for_all_images(processed_layers)
+        try:
+            # 第一階段：處理各圖層（只在需要 *_processed.png 時寫出）
+            if args.no_merge or args.save_intermediate:
+                print("\n=== 🎨 階段 1: 處理圖層 ===")
+                processor.process_all_layers()
+            
+            if args.no_merge:
+                print("\n⏹️ 僅處理圖層模式，跳過合成")
+            else:
+                # 第二階段：圖層合成（融合模式，不讀回中間檔）
+                print("\n=== 🔄 階段 2: 圖層合成 ===")
+                processor.merge_layers_fused()
+        finally:
+            processor.close()
         
         print(f"\n🎉 處理完成！結果儲存在: {args.output}")
         
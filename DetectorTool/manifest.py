@@ -0,0 +1,70 @@
+import json
+import os
+import threading
+
+
+class DetectionManifest:
+    """
+    輸出資料夾中的偵測紀錄（detections.jsonl），取代每個偵測一個 JSON 檔。
+    - 每行一筆 RectInfo.to_dict()，執行中只會附加；重跑時同一 filename 以最後一筆為準。
+    - close() 時整理一次：每個 filename 只留最後一筆，並移除裁切圖已不存在的紀錄
+      （例如增量模式刪除的過期輸出），讀取端不會再看到指向不存在檔案的紀錄。
+    - 只由單一行程寫入（多行程模式由主行程統一寫入），執行緒間以 lock 保護。
+    """
+
+    FILENAME = "detections.jsonl"
+    FLUSH_EVERY = 100
+
+    def __init__(self, output):
+        self.output = output
+        self.path = os.path.join(output, self.FILENAME)
+        os.makedirs(output, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def append(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._pending += 1
+            if self._pending >= self.FLUSH_EVERY:
+                self._pending = 0
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+            self.compact()
+
+    def compact(self):
+        """重寫紀錄檔：每個 filename 只留最後一筆，略過裁切圖已被刪除的紀錄"""
+        records = self.read(self.output)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records.values():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+
+    @classmethod
+    def read(cls, output):
+        """
+        讀取整份紀錄，回傳 filename -> record（依第一次出現的順序，內容以最後一筆為準）
+        裁切圖（rect_filename.png）已不存在的紀錄會略過
+        """
+        path = os.path.join(output, cls.FILENAME)
+        records = {}
+        if not os.path.exists(path):
+            return records
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 中斷時可能留下不完整的最後一行
+                    continue
+                records[record["filename"]] = record
+        return {
+            filename: record for filename, record in records.items()
+            if os.path.exists(os.path.join(output, f"{record.get('rect_filename', filename)}.png"))
+        }
@@ -0,0 +1,154 @@
+import queue
+import threading
+import time
+import traceback
+
+_DONE = object()
+
+
+class StageStats:
+    """單一階段的處理數量、忙碌時間與起訖時間（執行緒安全）"""
+
+    def __init__(self, name, threads):
+        self.name = name
+        self.threads = threads
+        self.count = 0
+        self.busy = 0.0
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def record(self, start, end, count=1):
+        with self._lock:
+            self.count += count
+            self.busy += end - start
+            self.started = start if self.started is None else min(self.started, start)
+            self.finished = end if self.finished is None else max(self.finished, end)
+
+    @property
+    def wall(self):
+        if self.started is None:
+            return 0.0
+        return self.finished - self.started
+
+    @property
+    def throughput(self):
+        return self.count / self.wall if self.wall > 0 else 0.0
+
+    def summary(self):
+        return (
+            f"{self.name:<8} threads={self.threads:<2} items={self.count:<6} "
+            f"{self.throughput:8.2f} items/s  busy={self.busy:8.2f}s  wall={self.wall:8.2f}s"
+        )
+
+
+class StagedPipeline:
+    """
+    讀取 → 推論 → 寫出 三段式管線。
+    - reader 執行緒池負責讀檔與解碼，writer 執行緒池負責後處理與 PNG 編碼。
+    - 推論固定在單一執行緒，每次最多取 batch_size 筆送進 infer_fn。
+    - 階段之間以有界佇列相連；下游較慢時上游會被阻塞（backpressure）。
+    read_fn(item) -> data
+    infer_fn([data, ...]) -> [result, ...]
+    write_fn(item, data, result) -> 任意回傳值
+    """
+
+    def __init__(self, read_fn, infer_fn, write_fn, readers=2, writers=2, queue_size=8, batch_size=1):
+        self.read_fn = read_fn
+        self.infer_fn = infer_fn
+        self.write_fn = write_fn
+        self.readers = max(1, readers)
+        self.writers = max(1, writers)
+        self.queue_size = max(1, queue_size)
+        self.batch_size = max(1, batch_size)
+        self.stats = {
+            "read": StageStats("read", self.readers),
+            "infer": StageStats("infer", 1),
+            "write": StageStats("write", self.writers),
+        }
+
+    def run(self, items):
+        """執行管線，回傳 (results, errors)：results 為 {item: write_fn 回傳值}，errors 為 {item: traceback}"""
+        input_queue = queue.Queue()
+        decoded_queue = queue.Queue(maxsize=self.queue_size)
+        detected_queue = queue.Queue(maxsize=self.queue_size)
+        results, errors = {}, {}
+        lock = threading.Lock()
+
+        def fail(item):
+            with lock:
+                errors[item] = traceback.format_exc()
+
+        def reader():
+            while True:
+                item = input_queue.get()
+                if item is _DONE:
+                    decoded_queue.put(_DONE)
+                    return
+                start = time.perf_counter()
+                try:
+                    data = self.read_fn(item)
+                except Exception:
+                    fail(item)
+                    continue
+                self.stats["read"].record(start, time.perf_counter())
+                decoded_queue.put((item, data))
+
+        def infer():
+            running = self.readers
+            while running:
+                batch = []
+                while running and len(batch) < self.batch_size:
+                    entry = decoded_queue.get()
+                    if entry is _DONE:
+                        running -= 1
+                    else:
+                        batch.append(entry)
+                if not batch:
+                    continue
+                start = time.perf_counter()
+                try:
+                    detections = self.infer_fn([data for _, data in batch])
+                except Exception:
+                    for item, _ in batch:
+                        fail(item)
+                    continue
+                self.stats["infer"].record(start, time.perf_counter(), len(batch))
+                for (item, data), result in zip(batch, detections):
+                    detected_queue.put((item, data, result))
+            for _ in range(self.writers):
+                detected_queue.put(_DONE)
+
+        def writer():
+            while True:
+                entry = detected_queue.get()
+                if entry is _DONE:
+                    return
+                item, data, result = entry
+                start = time.perf_counter()
+                try:
+                    value = self.write_fn(item, data, result)
+                except Exception:
+                    fail(item)
+                    continue
+                self.stats["write"].record(start, time.perf_counter())
+                with lock:
+                    results[item] = value
+
+        for item in items:
+            input_queue.put(item)
+        for _ in range(self.readers):
+            input_queue.put(_DONE)
+
+        threads = [threading.Thread(target=reader, daemon=True) for _ in range(self.readers)]
+        threads.append(threading.Thread(target=infer, daemon=True))
+        threads.extend(threading.Thread(target=writer, daemon=True) for _ in range(self.writers))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def print_stats(self):
+        for stats in self.stats.values():
+            print(stats.summary())
@@ -0,0 +1,116 @@
+import numpy as np
+
+
+def _intersections(boxes_a, boxes_b):
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter, area_a[:, None], area_b[None, :]
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """兩組 (x1, y1, x2, y2) 框兩兩之間的 IoU，回傳 (len(a), len(b)) 陣列"""
+    inter, area_a, area_b = _intersections(boxes_a, boxes_b)
+    return inter / np.maximum(area_a + area_b - inter, 1e-9)
+
+
+def ios_matrix(boxes_a, boxes_b):
+    """兩兩之間的 IoS（交集 / 較小框的面積）；被切在分塊邊界的殘缺框與完整框的 IoS 接近 1"""
+    inter, area_a, area_b = _intersections(boxes_a, boxes_b)
+    return inter / np.maximum(np.minimum(area_a, area_b), 1e-9)
+
+
+OVERLAP_METRICS = {"iou": iou_matrix, "ios": ios_matrix}
+
+
+def nms_groups(boxes, scores, iou_threshold, labels=None, metric="iou"):
+    """
+    貪婪 NMS，一次算好兩兩重疊矩陣（metric：iou 或 ios）後逐一挑選。
+    回傳 [(保留的索引, 被它抑制的索引陣列（含自己）), ...]，依分數由高到低。
+    labels 不為 None 時只有同類別的框會互相抑制。
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    order = np.argsort(-np.asarray(scores), kind="stable")
+    overlap = OVERLAP_METRICS[metric](boxes[order], boxes[order]) > iou_threshold
+    if labels is not None:
+        labels = np.asarray(labels)[order]
+        overlap &= labels[:, None] == labels[None, :]
+    suppressed = np.zeros(len(order), dtype=bool)
+    groups = []
+    for i in range(len(order)):
+        if suppressed[i]:
+            continue
+        group = overlap[i] & ~suppressed
+        group[i] = True
+        suppressed |= group
+        groups.append((order[i], order[group]))
+    return groups
+
+
+def nms(boxes, scores, iou_threshold, labels=None, metric="iou"):
+    """貪婪 NMS，回傳保留的索引（依分數由高到低）"""
+    groups = nms_groups(boxes, scores, iou_threshold, labels, metric)
+    return np.array([keep for keep, _ in groups], dtype=np.int64)
+
+
+def merge_boxes(boxes, scores, method="union"):
+    """
+    把一組重疊的框合併為一個
+    - union：涵蓋所有框的外接矩形
+    - weighted：以分數加權平均座標
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if method == "union":
+        return np.r_[boxes[:, :2].min(axis=0), boxes[:, 2:].max(axis=0)]
+    if method == "weighted":
+        weights = np.asarray(scores, dtype=np.float64)
+        return (boxes * weights[:, None]).sum(axis=0) / max(weights.sum(), 1e-9)
+    raise ValueError(f"Unknown merge method: {method}")
+
+
+def postprocess(result, iou_threshold=None, min_score=None, class_aware=True, merge=None, metric="iou"):
+    """
+    偵測結果 [(bbox, label, score), ...] 的後處理，回傳相同格式並依分數由高到低排序
+    - min_score：捨棄分數低於此值的偵測
+    - iou_threshold：NMS 門檻，None 表示不做 NMS
+    - class_aware：只抑制同 label 的框；False 時不分類別
+    - merge：None 只保留分數最高的框；union / weighted 把被抑制的框合併進保留的框
+    - metric：重疊的計算方式，iou 或 ios（交集 / 較小框面積）
+    """
+    if min_score is not None:
+        result = [det for det in result if det[2] >= min_score]
+    if not result or iou_threshold is None:
+        return sorted(result, key=lambda det: det[2], reverse=True)
+
+    boxes = np.array([det[0] for det in result], dtype=np.float64)
+    scores = np.array([det[2] for det in result], dtype=np.float64)
+    labels = [det[1] for det in result] if class_aware else None
+    processed = []
+    for keep, group in nms_groups(boxes, scores, iou_threshold, labels, metric):
+        bbox, label, score = result[keep]
+        if merge and len(group) > 1:
+            bbox = tuple(int(round(v)) for v in merge_boxes(boxes[group], scores[group], merge))
+        processed.append((bbox, label, score))
+    return processed
+
+
+class PostProcessor:
+    """
+    BaseDetector.postprocessor 使用的設定物件：detector.postprocessor = PostProcessor(...)
+    偵測結果（含快取命中）都會經過它，快取中保存的仍是原始結果。
+    """
+
+    def __init__(self, iou_threshold=None, min_score=None, class_aware=True, merge=None):
+        self.iou_threshold = iou_threshold
+        self.min_score = min_score
+        self.class_aware = class_aware
+        self.merge = merge
+
+    def __call__(self, result):
+        return postprocess(result, self.iou_threshold, self.min_score, self.class_aware, self.merge)
@@ -1,12 +1,16 @@
 import os
 import glob
 import argparse
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from .video_processor import VideoProcessor  # 導入您轉換好的 VideoProcessor
 
-def process_video_files(folder_path, fps="16", keep_frames=5, output_dir=None, dry_run=False):
+def process_video_files(folder_path, fps="16", keep_frames=5, output_dir=None, dry_run=False, stream=False, seek=False, jobs=1):
     """
     處理指定資料夾中的所有 .mp4 檔案
+    jobs > 1 時同時處理多個影片（見 process_videos_parallel）
     """
     processor = VideoProcessor()
     
@@ -27,24 +31,69 @@ def process_video_files(folder_path, fps="16", keep_frames=5, output_dir=None, d
         return
     
     print(f"找到 {len(video_files)} 個影片檔案")
-    print(f"使用 VideoProcessor.extract_png()")
+    method = 'extract_tail_frames' if seek else 'stream_frames' if stream else 'extract_png'
+    print(f"使用 VideoProcessor.{method}()")
     print(f"幀率參數：{fps}")
     print(f"保留最後 {keep_frames} 張畫面")
     
     if dry_run:
         print("*** DRY RUN 模式 - 不會執行實際操作 ***")
     
+    if jobs > 1 and len(video_files) > 1:
+        process_videos_parallel(video_files, fps, keep_frames, output_dir, dry_run, stream, seek, jobs)
+        return
+    
     for video_file in video_files:
-        process_single_video(video_file, processor, fps, keep_frames, output_dir, dry_run)
+        process_single_video(video_file, processor, fps, keep_frames, output_dir, dry_run, stream, seek)
+
+# [新增] 多個影片平行處理
+def process_videos_parallel(video_files, fps, keep_frames, output_dir=None, dry_run=False, stream=False, seek=False, jobs=2):
+    """
+    以 jobs 個執行緒同時處理多個影片（實際工作在 ffmpeg 子行程中進行）。
+    - 每個 ffmpeg 的 -threads 為 CPU 核心數 / jobs，總執行緒數約等於核心數。
+    - 每個影片的訊息先寫入各自的緩衝區，完成後整段輸出，不會互相穿插。
+    - 每完成一個影片顯示整體進度與處理速度。
+    """
+    jobs = min(jobs, len(video_files))
+    threads = max(1, (os.cpu_count() or 1) // jobs)
+    print(f"平行處理：{jobs} 個工作，每個 ffmpeg 使用 {threads} 個執行緒")
+    
+    start = time.perf_counter()
+    done = 0
+    failed = 0
+    
+    def run(video_file):
+        lines = []
+        processor = VideoProcessor(threads=threads, log=lines.append, quiet=True)
+        try:
+            process_single_video(video_file, processor, fps, keep_frames, output_dir, dry_run, stream, seek, lines.append)
+            return lines, True
+        except Exception as e:
+            lines.append(f"錯誤：處理 {Path(video_file).name} 時發生例外 - {e}")
+            return lines, False
+    
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(run, video_file) for video_file in video_files]
+        for future in as_completed(futures):
+            lines, ok = future.result()
+            # 只在主執行緒輸出，各影片的訊息整段印出
+            done += 1
+            failed += not ok
+            elapsed = time.perf_counter() - start
+            print("\n".join(str(line) for line in lines))
+            print(f"[{done}/{len(video_files)}] 經過 {elapsed:.1f}s，{done / elapsed:.2f} 影片/s")
+    
+    elapsed = time.perf_counter() - start
+    print(f"\n共處理 {done} 個影片（失敗 {failed} 個），耗時 {elapsed:.1f}s，平均 {done / elapsed:.2f} 影片/s")
 
-def process_single_video(video_file_path, processor, fps, keep_frames, output_dir=None, dry_run=False):
+def process_single_video(video_file_path, processor, fps, keep_frames, output_dir=None, dry_run=False, stream=False, seek=False, log=print):
     """
     處理單個影片檔案
     """
     video_path = Path(video_file_path)
     video_name = video_path.stem
     
-    print(f"\n處理影片：{video_name}.mp4")
+    log(f"\n處理影片：{video_name}.mp4")
     
     # 決定輸出資料夾位置
     if output_dir:
@@ -54,6 +103,15 @@ def process_single_video(video_file_path, processor, fps, keep_frames, output_di
         # 使用影片旁邊的預設資料夾
         final_output_folder = video_path.parent
     
+    # 與原流程相同：未指定輸出資料夾時，保留的畫面放在 <name>_frames/ 中
+    kept_output_folder = final_output_folder if output_dir else video_path.parent / f"{video_name}_frames"
+    if seek:
+        process_seeked_video(video_path, processor, fps, keep_frames, kept_output_folder, dry_run, log)
+        return
+    if stream:
+        process_streamed_video(video_path, processor, fps, keep_frames, kept_output_folder, dry_run, log)
+        return
+    
     # 步驟 1: 使用 VideoProcessor.extract_png()
     if not dry_run:
         try:
@@ -67,20 +125,20 @@ def process_single_video(video_file_path, processor, fps, keep_frames, output_di
                 temp_output_folder = video_path.parent / f"{video_name}_frames"
             
             if not success:
-                print(f"錯誤：提取畫面失敗")
+                log(f"錯誤：提取畫面失敗")
                 return
                 
         except Exception as e:
-            print(f"錯誤：無法執行畫面提取 - {e}")
+            log(f"錯誤：無法執行畫面提取 - {e}")
             return
     else:
-        print(f"[DRY RUN] processor.extract_png('{video_file_path}', {fps})")
+        log(f"[DRY RUN] processor.extract_png('{video_file_path}', {fps})")
         temp_output_folder = video_path.parent / f"{video_name}_frames"
     
     # 步驟 2: 處理畫面檔案
     if not dry_run:
         if not temp_output_folder.exists():
-            print(f"錯誤：輸出資料夾 '{temp_output_folder}' 不存在")
+            log(f"錯誤：輸出資料夾 '{temp_output_folder}' 不存在")
             return
         
         frame_files = sorted(glob.glob(str(temp_output_folder / "frame_*.png")))
@@ -88,14 +146,14 @@ def process_single_video(video_file_path, processor, fps, keep_frames, output_di
         frame_files = [str(temp_output_folder / f"frame_{i:04d}.png") for i in range(1, 82)]
     
     if not frame_files:
-        print(f"在 '{temp_output_folder}' 中沒有找到畫面檔案")
+        log(f"在 '{temp_output_folder}' 中沒有找到畫面檔案")
         return
     
     total_frames = len(frame_files)
-    print(f"找到 {total_frames} 個畫面檔案")
+    log(f"找到 {total_frames} 個畫面檔案")
     
     if total_frames <= keep_frames:
-        print(f"畫面數量不超過 {keep_frames} 張，跳過處理")
+        log(f"畫面數量不超過 {keep_frames} 張，跳過處理")
         return
     
     # 步驟 3: 處理最後 N 張畫面
@@ -103,7 +161,7 @@ def process_single_video(video_file_path, processor, fps, keep_frames, output_di
     
     if output_dir:
         # 如果指定了輸出資料夾，將檔案移動到那裡
-        print(f"移動最後 {keep_frames} 張畫面到 {final_output_folder}...")
+        log(f"移動最後 {keep_frames} 張畫面到 {final_output_folder}...")
         
         for i, frame_file in enumerate(last_frames, 1):
             old_path = Path(frame_file)
@@ -115,14 +173,14 @@ def process_single_video(video_file_path, processor, fps, keep_frames, output_di
                     # 使用 shutil.move 而不是 rename，因為可能跨目錄
                     import shutil
                     shutil.move(str(old_path), str(new_path))
-                    print(f"  {old_path.name} → {new_path}")
+                    log(f"  {old_path.name} → {new_path}")
                 except OSError as e:
-                    print(f"錯誤：無法移動 {old_path.name} - {e}")
+                    log(f"錯誤：無法移動 {old_path.name} - {e}")
             else:
-                print(f"  [DRY RUN] {old_path.name} → {new_path}")
+                log(f"  [DRY RUN] {old_path.name} → {new_path}")
     else:
         # 原地重新命名
-        print(f"重新命名最後 {keep_frames} 張畫面...")
+        log(f"重新命名最後 {keep_frames} 張畫面...")
         
         for i, frame_file in enumerate(last_frames, 1):
             old_path = Path(frame_file)
@@ -132,21 +190,21 @@ def process_single_video(video_file_path, processor, fps, keep_frames, output_di
             if not dry_run:
                 try:
                     old_path.rename(new_path)
-                    print(f"  {old_path.name} → {new_name}")
+                    log(f"  {old_path.name} → {new_name}")
                 except OSError as e:
-                    print(f"錯誤：無法重新命名 {old_path.name} - {e}")
+                    log(f"錯誤：無法重新命名 {old_path.name} - {e}")
             else:
-                print(f"  [DRY RUN] {old_path.name} → {new_name}")
+                log(f"  [DRY RUN] {old_path.name} → {new_name}")
     
     # 步驟 4: 刪除不需要的畫面檔案
     if output_dir:
         # 如果使用指定輸出資料夾，刪除所有原始畫面檔案
         frames_to_delete = frame_files  # 刪除所有原始檔案
-        print(f"刪除所有 {len(frames_to_delete)} 張原始畫面檔案...")
+        log(f"刪除所有 {len(frames_to_delete)} 張原始畫面檔案...")
     else:
         # 原地處理，只刪除前面的檔案
         frames_to_delete = frame_files[:-keep_frames]
-        print(f"刪除前 {len(frames_to_delete)} 張畫面...")
+        log(f"刪除前 {len(frames_to_delete)} 張畫面...")
     
     if not dry_run:
         deleted_count = 0
@@ -155,8 +213,8 @@ def process_single_video(video_file_path, processor, fps, keep_frames, output_di
                 os.remove(frame_file)
                 deleted_count += 1
             except OSError as e:
-                print(f"錯誤：無法刪除 {frame_file} - {e}")
-        print(f"✅ 已刪除 {deleted_count} 張畫面")
+                log(f"錯誤：無法刪除 {frame_file} - {e}")
+        log(f"✅ 已刪除 {deleted_count} 張畫面")
         
         # 如果使用輸出資料夾且原始frames資料夾為空，刪除它
         if output_dir and temp_output_folder.exists():
@@ -164,13 +222,80 @@ def process_single_video(video_file_path, processor, fps, keep_frames, output_di
                 remaining_files = list(temp_output_folder.glob("*"))
                 if not remaining_files:
                     temp_output_folder.rmdir()
-                    print(f"✅ 已刪除空的資料夾：{temp_output_folder}")
+                    log(f"✅ 已刪除空的資料夾：{temp_output_folder}")
             except OSError:
                 pass  # 忽略刪除資料夾的錯誤
     else:
-        print(f"[DRY RUN] 將刪除 {len(frames_to_delete)} 張畫面")
+        log(f"[DRY RUN] 將刪除 {len(frames_to_delete)} 張畫面")
+    
+    log(f"✅ 處理完成：{video_name}.mp4")
+
+# [新增] 串流模式：畫面直接從 ffmpeg 管線讀入記憶體，只寫出最後 N 張
+def process_streamed_video(video_path, processor, fps, keep_frames, output_folder, dry_run=False, log=print):
+    """
+    以 VideoProcessor.stream_frames() 逐幀讀取，只在記憶體中保留最後 keep_frames 張，
+    不產生 <name>_frames/ 暫存資料夾，也不需要刪除多餘畫面
+    """
+    video_name = video_path.stem
+    
+    if dry_run:
+        log(f"[DRY RUN] processor.stream_frames('{video_path}', {fps})")
+        log(f"  [DRY RUN] 最後 {keep_frames} 張畫面 → {output_folder / f'{video_name}[1..{keep_frames}].png'}")
+        return
+    
+    last_frames = deque(maxlen=keep_frames)
+    total_frames = 0
+    for _, _, frame in processor.stream_frames(str(video_path), int(fps)):
+        last_frames.append(frame)
+        total_frames += 1
+    
+    if not total_frames:
+        log(f"錯誤：無法從 {video_path.name} 讀取畫面")
+        return
+    
+    log(f"讀取 {total_frames} 個畫面")
+    
+    if total_frames <= keep_frames:
+        log(f"畫面數量不超過 {keep_frames} 張，跳過處理")
+        return
+    
+    log(f"寫出最後 {keep_frames} 張畫面到 {output_folder}...")
+    output_folder.mkdir(parents=True, exist_ok=True)
+    for i, frame in enumerate(last_frames, 1):
+        new_path = output_folder / f"{video_name}[{i}].png"
+        try:
+            frame.save(new_path)
+            log(f"  → {new_path}")
+        except OSError as e:
+            log(f"錯誤：無法寫出 {new_path.name} - {e}")
+    
+    log(f"✅ 處理完成：{video_name}.mp4")
+
+# [新增] seek 模式：以 ffprobe 時長計算最後 N 張的時間點，只解碼這幾張
+def process_seeked_video(video_path, processor, fps, keep_frames, output_folder, dry_run=False, log=print):
+    video_name = video_path.stem
+    
+    if dry_run:
+        log(f"[DRY RUN] processor.extract_tail_frames('{video_path}', {fps}, {keep_frames})")
+        log(f"  [DRY RUN] 最後 {keep_frames} 張畫面 → {output_folder / f'{video_name}[1..{keep_frames}].png'}")
+        return
+    
+    total_frames, written = processor.extract_tail_frames(
+        str(video_path), fps, keep_frames, output_folder, video_name
+    )
+    if not total_frames:
+        log(f"錯誤：無法取得 {video_path.name} 的畫面資訊")
+        return
+    
+    log(f"預估 {total_frames} 個畫面")
+    
+    if total_frames <= keep_frames:
+        log(f"畫面數量不超過 {keep_frames} 張，跳過處理")
+        return
     
-    print(f"✅ 處理完成：{video_name}.mp4")
+    for new_path in written:
+        log(f"  → {new_path}")
+    log(f"✅ 處理完成：{video_name}.mp4（寫出 {len(written)} 張）")
 
 def main():
     """主函數"""
@@ -192,6 +317,9 @@ def main():
     parser.add_argument("--output", "-o", help="指定輸出資料夾，所有處理後的圖片都會放到這裡（預設：與影片相同位置）")
     parser.add_argument("--dry-run", "-n", action="store_true", help="試運行模式，只顯示將要執行的操作而不實際執行")
     parser.add_argument("--verbose", "-v", action="store_true", help="顯示詳細資訊")
+    parser.add_argument("--stream", action="store_true", help="直接從 ffmpeg 管線讀取畫面，只寫出保留的畫面（不產生暫存畫面檔）")
+    parser.add_argument("--seek", action="store_true", help="依影片時長直接 seek 到最後幾張畫面，只解碼需要保留的畫面")
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="同時處理的影片數量，ffmpeg 執行緒會依 CPU 核心數平均分配（預設：1）")
     
     args = parser.parse_args()
     
@@ -205,7 +333,7 @@ def main():
             print("模式：試運行（不執行實際操作）")
         print("=" * 30)
     
-    process_video_files(args.folder, args.fps, args.keep, args.output, args.dry_run)
+    process_video_files(args.folder, args.fps, args.keep, args.output, args.dry_run, args.stream, args.seek, args.jobs)
     
     if args.dry_run:
         print("\n*** DRY RUN 完成 - 沒有實際執行任何操作 ***")
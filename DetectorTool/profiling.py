@@ -0,0 +1,111 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from PIL import Image, ImageFile
+
+
+class StageRecord:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.bytes = 0
+
+
+class Profiler:
+    """
+    opt-in 的分階段計時器。
+    - 記錄每個階段的耗時、呼叫次數與處理的位元組數（影像為 寬×高×通道，路徑為檔案大小）。
+    - instrument() 只包裝指定 detector 實例的方法，未啟用時沒有任何額外負擔。
+    - 計時為含巢狀呼叫的總時間（例如 create_blurred_mask 內含 create_mask）。
+    """
+
+    STAGES = (
+        "load_image", "detect", "detect_batch", "detect_tiled", "postprocess",
+        "create_mask", "create_blurred_mask", "crop", "force_rect_crop", "Crop", "save_image",
+    )
+
+    def __init__(self):
+        self.records = {}
+        self.events = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._wall_start = None
+        self._wall_end = None
+
+    @contextmanager
+    def stage(self, name, nbytes=0):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                record = self.records.setdefault(name, StageRecord(name))
+                record.calls += 1
+                record.seconds += end - start
+                record.bytes += nbytes
+                self._wall_start = start if self._wall_start is None else min(self._wall_start, start)
+                self._wall_end = end if self._wall_end is None else max(self._wall_end, end)
+                self.events.append({
+                    "name": name,
+                    "ph": "X",
+                    "ts": (start - self._origin) * 1e6,
+                    "dur": (end - start) * 1e6,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "args": {"bytes": nbytes},
+                })
+
+    def instrument(self, detector, stages=STAGES):
+        """包裝 detector 實例上的方法；load_image 會在計時內完成解碼，讓解碼時間歸到該階段"""
+        for name in stages:
+            method = getattr(detector, name, None)
+            if method is None:
+                continue
+            setattr(detector, name, self._wrap(name, method))
+        return detector
+
+    def _wrap(self, name, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            with self.stage(name, self._nbytes(args[0]) if args else 0):
+                result = method(*args, **kwargs)
+                if name == "load_image" and isinstance(result, ImageFile.ImageFile):
+                    result.load()
+                return result
+        return wrapper
+
+    @staticmethod
+    def _nbytes(value):
+        if isinstance(value, Image.Image):
+            return value.width * value.height * len(value.getbands())
+        if isinstance(value, (str, os.PathLike)) and os.path.isfile(value):
+            return os.path.getsize(value)
+        return 0
+
+    def summary(self):
+        wall = (self._wall_end - self._wall_start) if self._wall_start is not None else 0.0
+        lines = [
+            f"{'stage':<22}{'calls':>8}{'total s':>10}{'mean ms':>10}{'MB':>10}{'% wall':>8}",
+        ]
+        for record in sorted(self.records.values(), key=lambda r: r.seconds, reverse=True):
+            mean_ms = record.seconds / record.calls * 1000 if record.calls else 0.0
+            share = record.seconds / wall * 100 if wall > 0 else 0.0
+            lines.append(
+                f"{record.name:<22}{record.calls:>8}{record.seconds:>10.3f}{mean_ms:>10.2f}"
+                f"{record.bytes / (1024 * 1024):>10.1f}{share:>7.1f}%"
+            )
+        lines.append(f"wall time: {wall:.3f}s (stage times include nested calls)")
+        return "\n".join(lines)
+
+    def save_trace(self, path):
+        """輸出 Chrome trace（chrome://tracing / Perfetto 可開啟）"""
+        with self._lock:
+            events = list(self.events)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
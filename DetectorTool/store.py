@@ -0,0 +1,165 @@
+import numpy as np
+
+
+DETECTION_DTYPE = np.dtype([
+    ("image", np.int32),
+    ("x1", np.int32),
+    ("y1", np.int32),
+    ("x2", np.int32),
+    ("y2", np.int32),
+    ("score", np.float32),
+    ("label", np.int16),
+])
+
+
+class DetectionStore:
+    """
+    以 NumPy 結構化陣列保存整個資料集偵測結果的欄位式儲存。
+    - 每筆偵測一列：image（影像編號）、x1/y1/x2/y2、score、label（標籤編號），約 26 bytes。
+    - 影像名稱與標籤字串各存一份在 images / labels，列中只記錄編號。
+    - filter / top_n / for_image 都回傳新的 DetectionStore（共用 images / labels），可串接。
+    - get_top_rects / get_best_rect 可直接傳入 DetectionStore，視為一份偵測結果。
+    """
+
+    def __init__(self, records=None, images=None, labels=None):
+        self.images = list(images or [])
+        self.labels = list(labels or [])
+        self._image_ids = {name: i for i, name in enumerate(self.images)}
+        self._label_ids = {label: i for i, label in enumerate(self.labels)}
+        self._records = records if records is not None else np.empty(0, dtype=DETECTION_DTYPE)
+        self._chunks = []
+
+    @classmethod
+    def from_results(cls, results):
+        """由 {影像名稱: [(bbox, label, score), ...]} 建立"""
+        store = cls()
+        for name, result in results.items():
+            store.add(name, result)
+        return store
+
+    def _derive(self, records):
+        # 共用名稱表，衍生的 store 加入新影像 / 標籤時編號仍一致
+        store = DetectionStore(records)
+        store.images = self.images
+        store.labels = self.labels
+        store._image_ids = self._image_ids
+        store._label_ids = self._label_ids
+        return store
+
+    def image_id(self, name):
+        if name not in self._image_ids:
+            self._image_ids[name] = len(self.images)
+            self.images.append(name)
+        return self._image_ids[name]
+
+    def label_id(self, label):
+        if label not in self._label_ids:
+            self._label_ids[label] = len(self.labels)
+            self.labels.append(label)
+        return self._label_ids[label]
+
+    def add(self, name, result):
+        """加入一張影像的偵測結果（detect() 的輸出格式）"""
+        image = self.image_id(name)
+        rows = [(image, *(int(v) for v in bbox), score, self.label_id(label)) for bbox, label, score in result]
+        self._chunks.append(np.array(rows, dtype=DETECTION_DTYPE))
+
+    @property
+    def records(self):
+        # 逐張加入時先累積成多個小陣列，需要時才合併一次
+        if self._chunks:
+            self._records = np.concatenate([self._records] + self._chunks)
+            self._chunks = []
+        return self._records
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        """逐筆產生 (bbox, label, score)，與 detect() 的輸出格式相同"""
+        records = self.records
+        boxes = np.stack([records["x1"], records["y1"], records["x2"], records["y2"]], axis=1).tolist()
+        for bbox, label, score in zip(boxes, records["label"].tolist(), records["score"].tolist()):
+            yield tuple(bbox), self.labels[label], score
+
+    def rect(self, index):
+        from .base import Rect  # base 會 import 本模組
+
+        row = self.records[index]
+        return Rect(int(row["x1"]), int(row["y1"]), int(row["x2"]), int(row["y2"]))
+
+    def boxes(self):
+        """(N, 4) 的 x1, y1, x2, y2 陣列"""
+        records = self.records
+        return np.stack([records["x1"], records["y1"], records["x2"], records["y2"]], axis=1)
+
+    def filter(self, min_score=None, labels=None, images=None):
+        """依分數下限、標籤與影像名稱篩選（向量化）"""
+        records = self.records
+        keep = np.ones(len(records), dtype=bool)
+        if min_score is not None:
+            keep &= records["score"] >= min_score
+        if labels is not None:
+            ids = [self._label_ids[label] for label in labels if label in self._label_ids]
+            keep &= np.isin(records["label"], ids)
+        if images is not None:
+            ids = [self._image_ids[name] for name in images if name in self._image_ids]
+            keep &= np.isin(records["image"], ids)
+        return self._derive(records[keep])
+
+    def for_image(self, name):
+        return self.filter(images=[name])
+
+    def best(self, label=None):
+        """分數最高的 bbox；沒有符合的偵測時回傳 None"""
+        store = self.filter(labels=[label]) if label else self
+        records = store.records
+        if len(records) == 0:
+            return None
+        row = records[np.argmax(records["score"])]
+        return (int(row["x1"]), int(row["y1"]), int(row["x2"]), int(row["y2"]))
+
+    def top_rects(self, n, label=None):
+        """所有列中分數最高的 n 個 bbox（不分影像，與 get_top_rects 相同）"""
+        store = self.filter(labels=[label]) if label else self
+        records = store.records
+        order = np.argsort(-records["score"], kind="stable")[:n]
+        return [tuple(int(v) for v in box) for box in store.boxes()[order]]
+
+    def sorted(self):
+        """依影像編號、分數由高到低排序（同分保持原順序）"""
+        records = self.records
+        return self._derive(records[np.lexsort((-records["score"], records["image"]))])
+
+    def top_n(self, n, label=None):
+        """每張影像只保留分數最高的 n 筆（可先限定 label）"""
+        store = self.filter(labels=[label]) if label else self
+        records = store.sorted().records
+        if len(records) == 0:
+            return store._derive(records)
+        starts = np.flatnonzero(np.r_[True, records["image"][1:] != records["image"][:-1]])
+        counts = np.diff(np.r_[starts, len(records)])
+        rank = np.arange(len(records)) - np.repeat(starts, counts)
+        return self._derive(records[rank < n])
+
+    def to_results(self):
+        """轉回 {影像名稱: [(bbox, label, score), ...]}，每張影像依分數排序"""
+        results = {}
+        store = self.sorted()
+        for image, detection in zip(store.records["image"].tolist(), store):
+            results.setdefault(self.images[image], []).append(detection)
+        return results
+
+    def save(self, path):
+        """以 .npz 儲存（records 與 images / labels 字串表）"""
+        np.savez_compressed(
+            path,
+            records=self.records,
+            images=np.array(self.images, dtype=str),
+            labels=np.array(self.labels, dtype=str),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["records"], data["images"].tolist(), data["labels"].tolist())
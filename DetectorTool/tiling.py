@@ -0,0 +1,96 @@
+import numpy as np
+
+from .postprocess import OVERLAP_METRICS, merge_boxes
+
+
+def _tile_starts(length, tile_size, step):
+    if length <= tile_size:
+        return [0]
+    starts = list(range(0, length - tile_size, step))
+    # 最後一塊貼齊邊緣，不補邊
+    return starts + [length - tile_size]
+
+
+def tile_grid(size, tile_size, overlap):
+    """
+    把 (寬, 高) 的影像切成 tile_size×tile_size、彼此重疊 overlap 像素的分塊
+    回傳 [(x1, y1, x2, y2), ...]（列優先）；影像小於分塊的方向只有一塊
+    """
+    if not 0 <= overlap < tile_size:
+        raise ValueError(f"tile overlap must be in [0, {tile_size}), got {overlap}")
+    width, height = size
+    step = tile_size - overlap
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in _tile_starts(height, tile_size, step)
+        for x in _tile_starts(width, tile_size, step)
+    ]
+
+
+def to_global(result, tile):
+    """把分塊內的偵測結果平移回整張影像的座標"""
+    x, y = tile[0], tile[1]
+    return [((x1 + x, y1 + y, x2 + x, y2 + y), label, score) for (x1, y1, x2, y2), label, score in result]
+
+
+def _seam_pairs(boxes, tile_boxes):
+    """兩兩偵測框的交集是否落在兩者所屬分塊的共同區域（接縫重疊區）內，且分屬不同分塊"""
+    def pairwise(a, b):
+        return (
+            np.maximum(a[:, None, 0], b[None, :, 0]), np.maximum(a[:, None, 1], b[None, :, 1]),
+            np.minimum(a[:, None, 2], b[None, :, 2]), np.minimum(a[:, None, 3], b[None, :, 3]),
+        )
+
+    ix1, iy1, ix2, iy2 = pairwise(boxes, boxes)
+    sx1, sy1, sx2, sy2 = pairwise(tile_boxes, tile_boxes)
+    inside = (
+        (np.minimum(ix2, sx2) > np.maximum(ix1, sx1))
+        & (np.minimum(iy2, sy2) > np.maximum(iy1, sy1))
+    )
+    different = np.any(tile_boxes[:, None, :] != tile_boxes[None, :, :], axis=2)
+    return inside & different
+
+
+def merge_tiles(results, tiles, iou_threshold=0.5, metric="ios"):
+    """
+    合併各分塊的偵測結果，回傳整張影像座標下依分數排序的結果
+    只合併「來自不同分塊、交集落在兩塊重疊區內」的同類別偵測，同一分塊內的框維持原樣。
+    被切在接縫的殘缺框會包含在完整框內（IoS 接近 1），以 union 合併進分數較高的框；
+    每個框在其他每個分塊中最多只合併一個重疊最大的框，重疊區內相鄰的兩個頭不會被併成一個
+    """
+    detections, owners = [], []
+    for result, tile in zip(results, tiles):
+        for det in to_global(result, tile):
+            detections.append(det)
+            owners.append(tile)
+    if not detections:
+        return []
+
+    boxes = np.array([det[0] for det in detections], dtype=np.float64)
+    scores = np.array([det[2] for det in detections], dtype=np.float64)
+    labels = np.array([det[1] for det in detections])
+    tile_boxes = np.array(owners, dtype=np.float64)
+    overlap = OVERLAP_METRICS[metric](boxes, boxes)
+    candidates = (
+        (overlap > iou_threshold)
+        & (labels[:, None] == labels[None, :])
+        & _seam_pairs(boxes, tile_boxes)
+    )
+    tile_ids = np.unique(tile_boxes, axis=0, return_inverse=True)[1].reshape(-1)
+
+    merged = []
+    used = np.zeros(len(detections), dtype=bool)
+    for i in np.argsort(-scores, kind="stable"):
+        if used[i]:
+            continue
+        group = [i]
+        pending = np.flatnonzero(candidates[i] & ~used)
+        for tile_id in np.unique(tile_ids[pending]):
+            in_tile = pending[tile_ids[pending] == tile_id]
+            group.append(in_tile[np.argmax(overlap[i, in_tile])])
+        used[group] = True
+        bbox, label, score = detections[i]
+        if len(group) > 1:
+            bbox = tuple(int(round(v)) for v in merge_boxes(boxes[group], scores[group], "union"))
+        merged.append((bbox, label, score))
+    return merged
@@ -0,0 +1,152 @@
+import numpy as np
+from PIL import Image
+
+from .postprocess import iou_matrix
+
+
+class SceneChangeDetector:
+    """
+    以縮小的灰階縮圖比較相鄰畫面，平均絕對差超過 threshold（0~1）視為場景切換。
+    縮圖只有 size 大小，每幀的成本遠低於一次偵測。
+    """
+
+    def __init__(self, threshold=0.25, size=(32, 32)):
+        self.threshold = threshold
+        self.size = size
+        self._previous = None
+
+    def thumbnail(self, image):
+        return np.asarray(image.convert("L").resize(self.size, Image.Resampling.BILINEAR), dtype=np.float32) / 255.0
+
+    def is_cut(self, image):
+        """回傳此畫面是否與上一張差異過大；第一張畫面視為切換"""
+        current = self.thumbnail(image)
+        previous, self._previous = self._previous, current
+        if previous is None:
+            return True
+        return float(np.abs(current - previous).mean()) > self.threshold
+
+
+class Track:
+    def __init__(self, bbox, label, score, frame_index):
+        self.box = np.asarray(bbox, dtype=np.float64)
+        self.velocity = np.zeros(4)
+        self.label = label
+        self.score = score
+        self.frame_index = frame_index
+        self.missed = 0
+
+    def position(self, frame_index):
+        """以等速模型推算 frame_index 時的框"""
+        return self.box + self.velocity * (frame_index - self.frame_index)
+
+
+class BoxTracker:
+    """
+    關鍵幀偵測之間的輕量追蹤器。
+    - update()：關鍵幀的偵測結果依 IoU 與既有軌跡貪婪配對，以 EMA（smoothing）平滑框與速度。
+    - predict()：中間畫面不做偵測，依各軌跡的平滑速度推算框位置。
+    - 關鍵幀上未配對的軌跡最多保留 max_missed 次，避免單次漏偵造成裁切框跳動。
+    輸出格式與 detect() 相同：[(bbox, label, score), ...]，bbox 為整數座標。
+    """
+
+    def __init__(self, iou_threshold=0.3, smoothing=0.5, max_missed=1, image_size=None):
+        self.iou_threshold = iou_threshold
+        self.smoothing = smoothing
+        self.max_missed = max_missed
+        self.image_size = image_size
+        self.tracks = []
+
+    def reset(self):
+        self.tracks = []
+
+    def update(self, detections, frame_index):
+        """以關鍵幀的偵測結果更新軌跡，回傳平滑後的結果"""
+        boxes = [bbox for bbox, _, _ in detections]
+        predicted = [track.position(frame_index) for track in self.tracks]
+        matched_tracks, matched_dets = set(), set()
+        if boxes and predicted:
+            ious = iou_matrix(predicted, boxes)
+            # 依 IoU 由大到小貪婪配對，同一 label 才能配對
+            for flat in np.argsort(-ious, axis=None, kind="stable"):
+                t, d = np.unravel_index(flat, ious.shape)
+                if ious[t, d] < self.iou_threshold:
+                    break
+                if t in matched_tracks or d in matched_dets or self.tracks[t].label != detections[d][1]:
+                    continue
+                matched_tracks.add(t)
+                matched_dets.add(d)
+                self._correct(self.tracks[t], detections[d], predicted[t], frame_index)
+
+        survivors = []
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    continue
+            survivors.append(track)
+        for d, (bbox, label, score) in enumerate(detections):
+            if d not in matched_dets:
+                survivors.append(Track(bbox, label, score, frame_index))
+        self.tracks = survivors
+        return self.predict(frame_index)
+
+    def _correct(self, track, detection, predicted, frame_index):
+        bbox, _, score = detection
+        elapsed = max(1, frame_index - track.frame_index)
+        measured = np.asarray(bbox, dtype=np.float64)
+        box = self.smoothing * predicted + (1 - self.smoothing) * measured
+        velocity = (box - track.box) / elapsed
+        track.velocity = self.smoothing * track.velocity + (1 - self.smoothing) * velocity
+        track.box = box
+        track.score = score
+        track.frame_index = frame_index
+        track.missed = 0
+
+    def predict(self, frame_index):
+        """推算 frame_index 時各軌跡的框（不更新軌跡）"""
+        result = []
+        for track in self.tracks:
+            box = np.round(track.position(frame_index))
+            if self.image_size is not None:
+                box = np.clip(box, 0, [self.image_size[0], self.image_size[1]] * 2)
+            x1, y1, x2, y2 = (int(v) for v in box)
+            if x2 > x1 and y2 > y1:
+                result.append(((x1, y1, x2, y2), track.label, track.score))
+        return result
+
+
+class FrameTracker:
+    """
+    決定哪些畫面要做完整偵測：每 interval 張一次，或偵測到場景切換時。
+    場景切換會清空軌跡，不會把上一個鏡頭的框帶到新鏡頭。
+    畫面讀入時先以 plan() 決定，偵測結果可能在之後整批送回；
+    清空軌跡延後到 result() 依畫面順序進行，切換前的畫面仍使用原本的軌跡。
+    """
+
+    def __init__(self, interval=5, scene_threshold=0.25, iou_threshold=0.3, smoothing=0.5, max_missed=1):
+        self.interval = max(1, interval)
+        self.scenes = SceneChangeDetector(scene_threshold) if scene_threshold > 0 else None
+        self.tracker = BoxTracker(iou_threshold, smoothing, max_missed)
+        self._since_key = None
+
+    def plan(self, image):
+        """依序對每張畫面呼叫一次；回傳 (是否需要完整偵測, 是否為場景切換)"""
+        cut = self.scenes.is_cut(image) if self.scenes is not None else self._since_key is None
+        if cut or self._since_key is None or self._since_key + 1 >= self.interval:
+            self._since_key = 0
+            return True, cut
+        self._since_key += 1
+        return False, cut
+
+    def result(self, frame_index, image, detections=None, cut=False):
+        """
+        依畫面順序呼叫；cut 為 plan() 回傳的場景切換旗標
+        關鍵幀傳入偵測結果以更新軌跡；中間畫面傳 None 取得推算結果
+        """
+        if cut:
+            self.tracker.reset()
+        self.tracker.image_size = image.size
+        if detections is not None:
+            return self.tracker.update(detections, frame_index)
+        return self.tracker.predict(frame_index)
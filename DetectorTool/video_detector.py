@@ -0,0 +1,147 @@
+"""
+影片直接偵測：以 ffmpeg 管線逐幀解碼，批次送進 HeadDetector / CensorDetector，
+只寫出裁切圖、遮罩與 RectInfo JSON（含畫面編號與時間），不產生完整畫面的 PNG。
+
+  python -m DetectorTool.video_detector --mode head clip.mp4 -o out --fps 4 --mask --info --batch_size 8
+  python -m DetectorTool.video_detector --mode head clip.mp4 -o out --force_rect_crop --resize --track 5
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+import traceback
+
+from .detector import add_detector_arguments, create_detector, create_manifest, process_image, validate_args
+from .tracking import FrameTracker
+from .video_processor import VideoProcessor
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(description="Run the detector directly on video frames")
+    parser.add_argument('inputs', nargs='+', help='Video files or folders containing .mp4 files')
+    parser.add_argument('--fps', type=float, default=None, help='Sample frames at this rate (default: native frame rate)')
+    # [新增] 追蹤模式：每 K 張（或場景切換時）才完整偵測，中間畫面以 IoU 追蹤 + 平滑推算
+    parser.add_argument('--track', type=int, default=1, metavar='K', help='Run full detection every K frames and track boxes in between (1 = detect every frame)')
+    parser.add_argument('--scene_threshold', type=float, default=0.25, help='Mean thumbnail difference (0-1) that counts as a scene cut; 0 disables')
+    parser.add_argument('--smoothing', type=float, default=0.5, help='EMA weight of the tracked box vs. a new detection (0 = no smoothing)')
+    add_detector_arguments(parser)
+    # [修改] 串流畫面每張都不同，快取幾乎不會命中，只會增加雜湊與寫入成本並擠掉圖片的快取；
+    # 預設停用，明確指定 --cache 時才使用
+    parser.set_defaults(cache=None)
+    return parser
+
+
+def list_videos(inputs):
+    videos = []
+    for path in inputs:
+        if os.path.isdir(path):
+            videos.extend(sorted(glob.glob(os.path.join(path, '*.mp4'))))
+        else:
+            videos.append(path)
+    return videos
+
+
+def frame_name(video_path, index):
+    """畫面的檔名（不含副檔名），作為裁切圖 / 遮罩 / JSON 的 base_filename"""
+    return f"{os.path.splitext(os.path.basename(video_path))[0]}_{index:06d}"
+
+
+def process_frames(detector, args, frames, tracker=None):
+    """
+    偵測一批 (index, timestamp, image, is_key, cut) 並寫出結果，回傳寫出的檔案列表
+    只有關鍵幀會送進 detect_batch；有 tracker 時中間畫面使用追蹤推算的框
+    """
+    keyframes = [image for _, _, image, is_key, _ in frames if is_key]
+    detections = iter(detector.detect_batch(keyframes, batch_size=len(keyframes)) if keyframes else [])
+    outputs = []
+    for index, timestamp, image, is_key, cut in frames:
+        result = next(detections) if is_key else None
+        if tracker is not None:
+            result = tracker.result(index, image, result, cut)
+        if not result:
+            continue
+        outputs.extend(process_image(
+            detector, args, image.filename, image, result, frame=(index, round(timestamp, 6))
+        ))
+    return outputs
+
+
+def create_tracker(args):
+    if args.track <= 1:
+        return None
+    return FrameTracker(args.track, args.scene_threshold, smoothing=args.smoothing)
+
+
+def process_video(detector, args, video_path, processor=None):
+    """逐批處理影片畫面，回傳 (畫面數, 完整偵測的畫面數, 寫出的檔案列表)"""
+    processor = processor or VideoProcessor()
+    tracker = create_tracker(args)
+    batch_size = max(1, args.batch_size)
+    frames = []
+    outputs = []
+    count = detected = pending_keys = 0
+    for index, timestamp, image in processor.stream_frames(video_path, args.fps):
+        # 記憶體中的畫面沒有檔名；設定 filename 讓 image_name() 取得 <影片>_<編號>
+        image.filename = f"{frame_name(video_path, index)}.png"
+        is_key, cut = tracker.plan(image) if tracker is not None else (True, False)
+        frames.append((index, timestamp, image, is_key, cut))
+        count += 1
+        detected += is_key
+        pending_keys += is_key
+        # 累積 batch_size 張關鍵幀（連同其間的畫面）後一起處理
+        if pending_keys >= batch_size:
+            outputs.extend(process_frames(detector, args, frames, tracker))
+            frames = []
+            pending_keys = 0
+    if frames:
+        outputs.extend(process_frames(detector, args, frames, tracker))
+    return count, detected, outputs
+
+
+def main():
+    parser = create_parser()
+    args = parser.parse_args()
+    validate_args(parser, args)
+
+    if args.mode == 'censor' and not args.filter:
+        print("Please specify --filter for censor mode.")
+        sys.exit(1)
+
+    videos = list_videos(args.inputs)
+    if not videos:
+        print("No video files found")
+        sys.exit(1)
+
+    detector = create_detector(args)
+    detector.manifest = create_manifest(args)
+    processor = VideoProcessor()
+    errors = {}
+    try:
+        for video_path in videos:
+            start = time.perf_counter()
+            try:
+                count, detected, outputs = process_video(detector, args, video_path, processor)
+            except Exception:
+                errors[video_path] = traceback.format_exc()
+                continue
+            elapsed = time.perf_counter() - start
+            rate = count / elapsed if elapsed > 0 else 0.0
+            print(
+                f"{video_path}: {count} frames ({detected} detected), {len(outputs)} files written, "
+                f"{elapsed:.2f}s ({rate:.1f} frames/s)"
+            )
+    finally:
+        if detector.cache is not None:
+            detector.cache.close()
+        if detector.manifest is not None:
+            detector.manifest.close()
+    for video_path in sorted(errors):
+        print(f"Failed: {video_path}\n{errors[video_path]}")
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
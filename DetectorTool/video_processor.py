@@ -13,64 +13,165 @@ import shutil
 from pathlib import Path
 import csv
 import io
+import json
+import sqlite3
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from fractions import Fraction
+
+import numpy as np
+from PIL import Image
+
+DEFAULT_PROBE_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'anime_head_detector', 'probe_info.sqlite')
+
+# [新增] probe_info 的結果快取
+class ProbeCache:
+    """
+    ffprobe 結果快取（SQLite），key 為 (絕對路徑, 檔案大小, mtime)。
+    - 檔案大小或 mtime 改變時視為未命中，重新掃描只會 probe 有變動的檔案。
+    - 也記錄 probe 失敗（非媒體檔），避免每次重新嘗試。
+    """
+
+    COMMIT_EVERY = 200
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS probes ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime REAL NOT NULL,"
+            " result TEXT)"
+        )
+        self.conn.commit()
+        self._pending = 0
+
+    def get(self, path, size, mtime):
+        """命中回傳 (True, 結果)，結果為 None 表示上次 probe 失敗；未命中回傳 (False, None)"""
+        row = self.conn.execute(
+            "SELECT size, mtime, result FROM probes WHERE path = ?", (path,)
+        ).fetchone()
+        if row is None or row[0] != size or row[1] != mtime:
+            return False, None
+        return True, (json.loads(row[2]) if row[2] is not None else None)
+
+    def put(self, path, size, mtime, result):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO probes (path, size, mtime, result) VALUES (?, ?, ?, ?)",
+            (path, size, mtime, json.dumps(result) if result is not None else None),
+        )
+        self._pending += 1
+        if self._pending >= self.COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        self._pending = 0
+        self.conn.commit()
+
+    def close(self):
+        self.commit()
+        self.conn.close()
 
 class VideoProcessor:
-    def __init__(self):
+    # [修改] 增加 threads / log / quiet 參數，供多個影片平行處理時使用
+    def __init__(self, threads=None, log=print, quiet=False):
+        """
+        threads: 每個 ffmpeg 行程的解碼執行緒數（None 為 ffmpeg 預設）
+        log: 訊息輸出函數（預設 print），平行處理時可改為寫入各自的緩衝區
+        quiet: 擷取 ffmpeg 的輸出，只在失敗時透過 log 顯示
+        """
         self.script_dir = Path(__file__).parent.absolute()
+        self.threads = threads
+        self.log = log
+        self.quiet = quiet
         self._check_dependencies()
     
     def _check_dependencies(self):
         """檢查必要工具是否安裝"""
         for tool in ['ffmpeg', 'ffprobe']:
             if not shutil.which(tool):
-                print(f"❌ {tool} not found")
+                self.log(f"❌ {tool} not found")
                 sys.exit(1)
     
+    def _ffmpeg(self, *args):
+        """
+        組出 ffmpeg 命令；有設定 threads 時限制所有階段的執行緒數：
+        - 濾鏡：全域的 -filter_threads / -filter_complex_threads
+        - 解碼：-threads 放在 -i 前
+        - 編碼：-threads 放在最後一個 -i 之後（作用於輸出）
+        """
+        cmd = ['ffmpeg', '-nostdin']
+        args = list(args)
+        if self.threads:
+            threads = str(self.threads)
+            cmd += ['-filter_threads', threads, '-filter_complex_threads', threads, '-threads', threads]
+            last_input = max(i for i, arg in enumerate(args) if arg == '-i')
+            args[last_input + 2:last_input + 2] = ['-threads', threads]
+        return cmd + args
+
     def _run_command(self, cmd, cwd=None, capture_output=False):
         """執行命令的通用函數"""
         try:
             result = subprocess.run(
                 cmd, 
                 cwd=cwd, 
-                capture_output=capture_output, 
+                capture_output=capture_output or self.quiet, 
                 text=True,
                 check=False
             )
+            if self.quiet and not capture_output and result.returncode != 0:
+                self.log('\n'.join(result.stderr.strip().splitlines()[-5:]))
             return result
         except subprocess.SubprocessError as e:
-            print(f"❌ 執行命令失敗: {' '.join(cmd)}")
-            print(f"錯誤: {e}")
+            self.log(f"❌ 執行命令失敗: {' '.join(cmd)}")
+            self.log(f"錯誤: {e}")
             return None
 
-    def convert_to_gif(self, input_file, fps=15, frames=None):
-        """單一影片轉 GIF（使用 palette 避免色彩偏差）"""
+    # [修改] 預設以單一 ffmpeg 完成（split/palettegen/paletteuse），調色盤不落地
+    def convert_to_gif(self, input_file, fps=15, frames=None, single_pass=True):
+        """
+        單一影片轉 GIF（使用 palette 避免色彩偏差）
+        single_pass: 只解碼一次，調色盤留在 filter graph 中；paletteuse 要等調色盤產生，
+                     因此所有畫面會暫存在記憶體，很長的影片可改用 single_pass=False（兩次解碼）
+        """
         input_path = Path(input_file)
         if not input_path.exists():
-            print(f"❌ 找不到檔案：{input_file}")
+            self.log(f"❌ 找不到檔案：{input_file}")
             return False
         
         name = input_path.stem
         palette = f"{name}_palette.png"
         output = f"{name}.gif"
         
-        print(f"🎞 轉換 {input_file} ➜ {output} (fps={fps})")
+        self.log(f"🎞 轉換 {input_file} ➜ {output} (fps={fps})")
         
-        # 生成調色盤
-        palette_cmd = [
-            'ffmpeg', '-y', '-i', str(input_path),
-            '-vf', f'fps={fps},palettegen', palette
-        ]
-        
-        result = self._run_command(palette_cmd, cwd=input_path.parent)
-        if result and result.returncode != 0:
-            print(f"❌ 調色盤生成失敗")
-            return False
-        
-        # 生成 GIF
-        gif_cmd = [
-            'ffmpeg', '-y', '-i', str(input_path), '-i', palette,
-            '-filter_complex', f'fps={fps}[x];[x][1:v]paletteuse'
-        ]
+        if single_pass:
+            gif_cmd = self._ffmpeg(
+                '-y', '-i', str(input_path),
+                '-filter_complex', f'fps={fps},split[a][b];[a]palettegen[p];[b][p]paletteuse'
+            )
+        else:
+            # 生成調色盤
+            palette_cmd = self._ffmpeg(
+                '-y', '-i', str(input_path),
+                '-vf', f'fps={fps},palettegen', palette
+            )
+            
+            result = self._run_command(palette_cmd, cwd=input_path.parent)
+            if result and result.returncode != 0:
+                self.log(f"❌ 調色盤生成失敗")
+                return False
+            
+            # 生成 GIF
+            gif_cmd = self._ffmpeg(
+                '-y', '-i', str(input_path), '-i', palette,
+                '-filter_complex', f'fps={fps}[x];[x][1:v]paletteuse'
+            )
         
         if frames:
             gif_cmd.extend(['-frames:v', str(frames)])
@@ -78,35 +179,61 @@ class VideoProcessor:
         gif_cmd.append(output)
         
         result = self._run_command(gif_cmd, cwd=input_path.parent)
+        # 清理調色盤檔案
+        palette_path = input_path.parent / palette
+        if not single_pass and palette_path.exists():
+            palette_path.unlink()
         if result and result.returncode == 0:
-            print(f"✅ GIF 輸出完成：{output}")
-            # 清理調色盤檔案
-            palette_path = input_path.parent / palette
-            if palette_path.exists():
-                palette_path.unlink()
+            self.log(f"✅ GIF 輸出完成：{output}")
             return True
         else:
-            print(f"❌ GIF 轉換失敗")
+            self.log(f"❌ GIF 轉換失敗")
             return False
 
-    def batch_convert_gif(self, fps=15, directory="."):
-        """批次轉換資料夾內的 .mp4 為 GIF"""
+    # [修改] 增加 jobs，多個影片同時轉換
+    def batch_convert_gif(self, fps=15, directory=".", jobs=1, single_pass=True):
+        """
+        批次轉換資料夾內的 .mp4 為 GIF
+        jobs > 1 時同時轉換多個影片，ffmpeg 執行緒依 CPU 核心數平均分配，
+        每個影片的訊息在完成後整段輸出
+        """
         mp4_files = list(Path(directory).glob("*.mp4"))
         
         if not mp4_files:
-            print(f"在 {directory} 中沒有找到 .mp4 檔案")
+            self.log(f"在 {directory} 中沒有找到 .mp4 檔案")
+            return
+        
+        self.log(f"找到 {len(mp4_files)} 個影片檔案")
+        
+        if jobs <= 1 or len(mp4_files) == 1:
+            for file in mp4_files:
+                self.convert_to_gif(str(file), fps, single_pass=single_pass)
             return
         
-        print(f"找到 {len(mp4_files)} 個影片檔案")
+        jobs = min(jobs, len(mp4_files))
+        threads = max(1, (os.cpu_count() or 1) // jobs)
+        self.log(f"平行轉換：{jobs} 個工作，每個 ffmpeg 使用 {threads} 個執行緒")
+        
+        def run(file):
+            lines = []
+            processor = VideoProcessor(threads=threads, log=lines.append, quiet=True)
+            ok = processor.convert_to_gif(str(file), fps, single_pass=single_pass)
+            return lines, ok
         
-        for file in mp4_files:
-            self.convert_to_gif(str(file), fps)
+        converted = 0
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(run, file) for file in mp4_files]
+            for future in as_completed(futures):
+                lines, ok = future.result()
+                converted += bool(ok)
+                self.log('\n'.join(str(line) for line in lines))
+        self.log(f"✅ 完成 {converted}/{len(mp4_files)} 個 GIF")
 
     def extract_frames(self, input_file, fps=1, format_type="jpg"):
         """抽出影片畫面（JPG 或 PNG）"""
         input_path = Path(input_file)
         if not input_path.exists():
-            print(f"❌ 找不到檔案：{input_file}")
+            self.log(f"❌ 找不到檔案：{input_file}")
             return False, None
         
         base = input_path.stem
@@ -114,20 +241,158 @@ class VideoProcessor:
         
         outdir.mkdir(exist_ok=True)
         
-        cmd = [
-            'ffmpeg', '-y', '-i', str(input_path),
+        cmd = self._ffmpeg(
+            '-y', '-i', str(input_path),
             '-qscale:v', '2', '-r', str(fps),
             str(outdir / f"frame_%04d.{format_type}")
-        ]
+        )
         
         result = self._run_command(cmd)
         if result and result.returncode == 0:
-            print(f"✅ 圖片已儲存到：{outdir}")
+            self.log(f"✅ 圖片已儲存到：{outdir}")
             return True, outdir
         else:
-            print(f"❌ 畫面抽取失敗")
+            self.log(f"❌ 畫面抽取失敗")
             return False, None
 
+    # [新增] 取得第一個影像串流的寬高、幀率、時長與幀數
+    def probe_stream(self, input_file):
+        """使用 ffprobe 取得影片串流資訊，失敗時回傳 None"""
+        cmd = [
+            'ffprobe', '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries',
+            'stream=width,height,avg_frame_rate,nb_frames,duration:stream_side_data=rotation:stream_tags=rotate'
+            ':format=duration',
+            '-of', 'json',
+            str(input_file)
+        ]
+        result = self._run_command(cmd, capture_output=True)
+        if not result or result.returncode != 0:
+            return None
+        try:
+            data = json.loads(result.stdout)
+            stream = data['streams'][0]
+        except (ValueError, KeyError, IndexError):
+            return None
+
+        try:
+            fps = float(Fraction(stream.get('avg_frame_rate', '0/1')))
+        except (ValueError, ZeroDivisionError):
+            fps = 0.0
+        duration = stream.get('duration') or data.get('format', {}).get('duration') or 0
+        nb_frames = stream.get('nb_frames', '')
+        # 旋轉資訊：新版 ffmpeg 在 side data（display matrix），舊版在 rotate 標籤
+        rotation = stream.get('tags', {}).get('rotate', 0)
+        for side_data in stream.get('side_data_list', []):
+            rotation = side_data.get('rotation', rotation)
+        try:
+            rotation = int(float(rotation))
+        except ValueError:
+            rotation = 0
+        return {
+            'width': int(stream['width']),
+            'height': int(stream['height']),
+            'fps': fps,
+            'duration': float(duration),
+            'nb_frames': int(nb_frames) if str(nb_frames).isdigit() else None,
+            'rotation': rotation,
+        }
+
+    # [新增] 直接從 ffmpeg stdout 讀取原始畫面，不經過 PNG 寫檔
+    def stream_frames(self, input_file, fps=None, pix_fmt="rgb24", as_image=True):
+        """
+        以 rawvideo 管線逐幀讀取影片，產生 (index, timestamp, frame)。
+        - fps 與 extract_frames 相同使用 -r 取樣；None 表示使用原始幀率。
+        - pix_fmt 支援 rgb24 / rgba / gray；as_image=False 時 frame 為 NumPy 陣列。
+        - ffmpeg 會依旋轉資訊自動轉正，旋轉 90 / 270 度時輸出的寬高與編碼寬高相反。
+        - stderr 寫入暫存檔，大量解碼錯誤訊息不會塞滿管線而卡住 ffmpeg。
+        """
+        channels = {'rgb24': 3, 'rgba': 4, 'gray': 1}[pix_fmt]
+        info = self.probe_stream(input_file)
+        if info is None:
+            self.log(f"❌ 無法取得影片資訊：{input_file}")
+            return
+        width, height = info['width'], info['height']
+        if info['rotation'] % 180 == 90:
+            width, height = height, width
+        rate = float(fps) if fps else info['fps']
+        frame_size = width * height * channels
+
+        cmd = self._ffmpeg('-v', 'error', '-i', str(input_file))
+        if fps:
+            cmd += ['-r', str(fps)]
+        cmd += ['-f', 'rawvideo', '-pix_fmt', pix_fmt, '-']
+
+        stderr_file = tempfile.TemporaryFile()
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+        index = 0
+        try:
+            while True:
+                buffer = process.stdout.read(frame_size)
+                if len(buffer) < frame_size:
+                    break
+                frame = np.frombuffer(buffer, dtype=np.uint8).reshape(
+                    (height, width, channels) if channels > 1 else (height, width)
+                )
+                if as_image:
+                    frame = Image.fromarray(frame)
+                yield index, (index / rate if rate else 0.0), frame
+                index += 1
+        finally:
+            process.stdout.close()
+            if process.poll() is None:
+                process.terminate()
+            process.wait()
+            stderr_file.seek(0)
+            stderr = stderr_file.read()
+            stderr_file.close()
+            if process.returncode not in (0, None) and index == 0:
+                self.log(f"❌ 畫面串流失敗：{stderr.decode(errors='replace').strip()}")
+
+    # [新增] 只解碼影片最後 count 張畫面（以 ffprobe 時長計算時間點，輸入端快速 seek）
+    def extract_tail_frames(self, input_file, fps, count, outdir, name_prefix):
+        """
+        依 fps 取樣時影片的最後 count 張畫面，輸出為 {name_prefix}[1..count].png。
+        成本只和 count 有關，與影片長度無關。
+        回傳 (總畫面數估計, 寫出的檔案列表)；無法取得影片資訊時回傳 (0, [])。
+        """
+        info = self.probe_stream(input_file)
+        if info is None or info['duration'] <= 0:
+            self.log(f"❌ 無法取得影片時長：{input_file}")
+            return 0, []
+        
+        fps = float(fps)
+        total_frames = int(info['duration'] * fps)
+        if total_frames <= count:
+            return total_frames, []
+        
+        # 最後一張來源畫面的時間點，往前推 count - 1 個取樣間隔
+        frame_interval = 1.0 / info['fps'] if info['fps'] > 0 else 0.0
+        last_timestamp = max(0.0, info['duration'] - frame_interval)
+        start = max(0.0, last_timestamp - (count - 1) / fps)
+        
+        outdir = Path(outdir)
+        outdir.mkdir(parents=True, exist_ok=True)
+        pattern = name_prefix.replace('%', '%%') + '[%d].png'
+        written = [outdir / f"{name_prefix}[{i}].png" for i in range(1, count + 1)]
+        # 先清掉上次留下的同名檔，回傳的列表才只包含這次寫出的畫面
+        for path in written:
+            path.unlink(missing_ok=True)
+        cmd = self._ffmpeg(
+            '-y',
+            '-ss', f'{start:.6f}', '-i', str(input_file),
+            '-r', f'{fps:g}', '-frames:v', str(count),
+            '-start_number', '1',
+            str(outdir / pattern)
+        )
+        
+        result = self._run_command(cmd)
+        if not result or result.returncode != 0:
+            self.log(f"❌ 畫面抽取失敗")
+            return total_frames, []
+        return total_frames, [path for path in written if path.exists()]
+
     def extract_jpg(self, input_file, fps=1):
         """抽出 JPG 畫面"""
         return self.extract_frames(input_file, fps, "jpg")
@@ -136,30 +401,73 @@ class VideoProcessor:
         """抽出 PNG 畫面"""
         return self.extract_frames(input_file, fps, "png")
 
-    def png2jpg(self, folder):
-        """PNG ➜ JPG 批次轉換"""
+    @staticmethod
+    def _save_jpg(img, out, quality):
+        """以 Pillow 轉存 JPG（與 ffmpeg 相同：直接捨棄 alpha，RGB 輸入為 4:4:4 色度取樣）"""
+        with Image.open(img) as image:
+            image.convert('RGB').save(out, 'JPEG', quality=quality, subsampling='4:4:4')
+
+    # [修改] 預設在行程內以 Pillow + 執行緒池轉換，不再每張圖啟動一個 ffmpeg
+    def png2jpg(self, folder, engine='pillow', jobs=None, quality=95, force=False):
+        """
+        PNG ➜ JPG 批次轉換
+        engine: 'pillow'（行程內轉換）或 'ffmpeg'（每張圖一個 ffmpeg，-qscale:v 2）
+        jobs: 同時轉換的數量（預設為 CPU 核心數）
+        quality: Pillow 的 JPEG 品質，95 約等於 ffmpeg 的 -qscale:v 2
+        force: 關閉增量模式；預設 .jpg 比 .png 新時跳過
+        """
         folder_path = Path(folder)
         if not folder_path.exists():
-            print(f"❌ 資料夾不存在：{folder}")
+            self.log(f"❌ 資料夾不存在：{folder}")
             return
         
         png_files = list(folder_path.glob("*.png"))
         
         if not png_files:
-            print(f"在 {folder} 中沒有找到 PNG 檔案")
+            self.log(f"在 {folder} 中沒有找到 PNG 檔案")
             return
         
-        print(f"找到 {len(png_files)} 個 PNG 檔案")
+        self.log(f"找到 {len(png_files)} 個 PNG 檔案")
         
+        tasks = []
         for img in png_files:
             out = img.with_suffix('.jpg')
-            cmd = ['ffmpeg', '-y', '-i', str(img), '-qscale:v', '2', str(out)]
-            
-            result = self._run_command(cmd)
-            if result and result.returncode == 0:
-                print(f"🖼 {img.name} ➜ {out.name}")
-            else:
-                print(f"❌ 轉換失敗：{img.name}")
+            if not force and out.exists() and out.stat().st_mtime >= img.stat().st_mtime:
+                continue
+            tasks.append((img, out))
+        if len(tasks) < len(png_files):
+            self.log(f"跳過 {len(png_files) - len(tasks)} 個已是最新的 JPG")
+        if not tasks:
+            return
+        
+        def convert(img, out):
+            """回傳錯誤訊息；成功時回傳 None"""
+            if engine == 'ffmpeg':
+                cmd = self._ffmpeg('-y', '-i', str(img), '-qscale:v', '2', str(out))
+                result = self._run_command(cmd, capture_output=True)
+                if result and result.returncode == 0:
+                    return None
+                return result.stderr.strip().splitlines()[-1] if result and result.stderr.strip() else 'ffmpeg 失敗'
+            try:
+                self._save_jpg(img, out, quality)
+                return None
+            except Exception as e:
+                # 單張圖片的任何錯誤（例如 DecompressionBombError）都不中斷整批轉換
+                return f"{type(e).__name__}: {e}"
+        
+        start = time.perf_counter()
+        converted = 0
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as executor:
+            for (img, out), error in zip(tasks, executor.map(lambda task: convert(*task), tasks)):
+                if error is None:
+                    converted += 1
+                    self.log(f"🖼 {img.name} ➜ {out.name}")
+                else:
+                    self.log(f"❌ 轉換失敗：{img.name}（{error}）")
+        
+        elapsed = time.perf_counter() - start
+        rate = converted / elapsed if elapsed > 0 else 0.0
+        self.log(f"✅ 轉換 {converted}/{len(tasks)} 個檔案，耗時 {elapsed:.2f}s（{rate:.1f} 檔案/s）")
 
     def batch_rename(self, file_format, new_name, start_num=1):
         """批次重新命名檔案"""
@@ -167,10 +475,10 @@ class VideoProcessor:
         files = sorted(glob.glob(pattern))
         
         if not files:
-            print(f"沒有找到 {pattern} 檔案")
+            self.log(f"沒有找到 {pattern} 檔案")
             return
         
-        print(f"找到 {len(files)} 個 {file_format} 檔案")
+        self.log(f"找到 {len(files)} 個 {file_format} 檔案")
         
         for i, file_path in enumerate(files):
             old_path = Path(file_path)
@@ -179,15 +487,96 @@ class VideoProcessor:
             
             try:
                 old_path.rename(new_path)
-                print(f"📝 {old_path.name} ➜ {new_filename}")
+                self.log(f"📝 {old_path.name} ➜ {new_filename}")
             except OSError as e:
-                print(f"❌ 重新命名失敗 {old_path.name}: {e}")
+                self.log(f"❌ 重新命名失敗 {old_path.name}: {e}")
+
+    # [新增] probe_info 的預先過濾：已知的媒體副檔名，其他檔案再檢查開頭的 magic bytes
+    MEDIA_EXTENSIONS = {
+        '.mp4', '.m4v', '.mov', '.mkv', '.webm', '.avi', '.wmv', '.flv', '.mpg', '.mpeg',
+        '.ts', '.m2ts', '.mts', '.3gp', '.ogv', '.gif', '.apng', '.webp', '.png', '.jpg',
+        '.jpeg', '.bmp', '.tif', '.tiff', '.mp3', '.m4a', '.aac', '.wav', '.flac', '.ogg', '.opus',
+    }
+    # 明顯不是媒體的副檔名，不讀取內容直接略過
+    SKIP_EXTENSIONS = {
+        '.txt', '.csv', '.json', '.xml', '.html', '.md', '.py', '.js', '.log', '.ini', '.cfg',
+        '.zip', '.7z', '.rar', '.exe', '.dll', '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.psd',
+        '.sqlite', '.db',
+    }
+    MAGIC_BYTES = (
+        (4, b'ftyp'),                  # MP4 / MOV / 3GP
+        (0, b'\x1a\x45\xdf\xa3'),      # Matroska / WebM
+        (0, b'RIFF'),                  # AVI / WAV / WebP
+        (0, b'GIF8'),
+        (0, b'\x89PNG'),
+        (0, b'\xff\xd8\xff'),          # JPEG
+        (0, b'OggS'),
+        (0, b'FLV'),
+        (0, b'ID3'),                   # MP3
+        (0, b'fLaC'),
+        (0, b'\x00\x00\x01\xba'),      # MPEG-PS
+        (0, b'\x30\x26\xb2\x75'),      # ASF / WMV
+        (0, b'II*\x00'),               # TIFF
+        (0, b'MM\x00*'),
+    )
+    # 太短的檔頭容易誤判（任何以 G 或 BM 開頭的檔案），需要多個位置同時符合
+    MAGIC_SEQUENCES = (
+        ((0, b'BM'), (6, b'\x00\x00\x00\x00')),    # BMP：保留欄位為 0
+        ((0, b'\x47'), (188, b'\x47')),               # MPEG-TS：每 188 bytes 一個 sync byte
+    )
+
+    @classmethod
+    def is_probable_media(cls, file_path):
+        """依副檔名或檔頭判斷是否值得交給 ffprobe"""
+        suffix = file_path.suffix.lower()
+        if suffix in cls.MEDIA_EXTENSIONS:
+            return True
+        if suffix in cls.SKIP_EXTENSIONS:
+            return False
+        try:
+            with open(file_path, 'rb') as f:
+                head = f.read(189)
+        except OSError:
+            return False
+
+        def matches(offset, magic):
+            return head[offset:offset + len(magic)] == magic
+
+        return (
+            any(matches(offset, magic) for offset, magic in cls.MAGIC_BYTES)
+            or any(all(matches(offset, magic) for offset, magic in sequence) for sequence in cls.MAGIC_SEQUENCES)
+        )
 
-    def probe_info(self, directory, recursive=False, output_csv=None):
-        """使用 ffprobe 擷取影片資訊"""
+    def _probe_file(self, file_path):
+        """單一檔案的 ffprobe，成功回傳各欄位的值（list），失敗回傳 None"""
+        cmd = [
+            'ffprobe', '-v', 'quiet',
+            '-print_format', 'default=nokey=1:noprint_wrappers=1',
+            '-select_streams', 'v:0',
+            '-show_entries', 'stream=codec_name,profile,codec_type,codec_tag_string,width,height,pix_fmt,avg_frame_rate',
+            '-show_entries', 'format=duration',
+            str(file_path)
+        ]
+        result = self._run_command(cmd, capture_output=True)
+        if not result or result.returncode != 0:
+            return None
+        lines = result.stdout.strip().split('\n')
+        # 確保有足夠的資料行
+        while len(lines) < 9:
+            lines.append('')
+        return lines[:9]
+
+    # [修改] 平行 probe + 預先過濾 + 快取，結果依掃描順序逐筆輸出
+    def probe_info(self, directory, recursive=False, output_csv=None, jobs=None, cache_path=None, probe_all=False):
+        """
+        使用 ffprobe 擷取影片資訊
+        jobs: 同時執行的 ffprobe 數量（預設為 CPU 核心數）
+        cache_path: ProbeCache 檔案，(路徑, 大小, mtime) 未變的檔案不再 probe；None 為不使用快取
+        probe_all: 不做副檔名 / 檔頭過濾，所有檔案都交給 ffprobe
+        """
         dir_path = Path(directory)
         if not dir_path.exists():
-            print(f"❌ 資料夾不存在：{directory}")
+            self.log(f"❌ 資料夾不存在：{directory}")
             return
         
         # CSV 標頭
@@ -197,92 +586,100 @@ class VideoProcessor:
             'avg_frame_rate', 'duration'
         ]
         
-        # 準備輸出
-        rows = []
-        
         # 決定掃描方式
         if recursive:
             files = dir_path.rglob("*")
-            print(f"📊 遞迴掃描 {directory} 中的媒體檔案...")
+            self.log(f"📊 遞迴掃描 {directory} 中的媒體檔案...")
         else:
             files = dir_path.iterdir()
-            print(f"📊 掃描 {directory} 中的媒體檔案...")
+            self.log(f"📊 掃描 {directory} 中的媒體檔案...")
+        
+        jobs = jobs or os.cpu_count() or 1
+        cache = ProbeCache(cache_path) if cache_path else None
         
-        # 掃描檔案
+        # 輸出在第一筆結果時才開始（沒有結果時不產生 CSV）
+        csv_file = None
+        writer = None
         processed_count = 0
-        for file_path in files:
-            if not file_path.is_file():
-                continue
-            
-            # 使用 ffprobe 取得資訊
-            cmd = [
-                'ffprobe', '-v', 'quiet',
-                '-print_format', 'default=nokey=1:noprint_wrappers=1',
-                '-select_streams', 'v:0',
-                '-show_entries', 'stream=codec_name,profile,codec_type,codec_tag_string,width,height,pix_fmt,avg_frame_rate',
-                '-show_entries', 'format=duration',
-                str(file_path)
-            ]
+        cached_count = 0
+        
+        def emit(file_path, lines):
+            nonlocal csv_file, writer, processed_count
+            # 計算相對路徑（如果是遞迴模式）
+            if recursive:
+                try:
+                    rel_path = file_path.relative_to(dir_path)
+                except ValueError:
+                    rel_path = file_path
+            else:
+                rel_path = file_path.name
+            row_data = dict(zip(fieldnames, [file_path.name, str(rel_path)] + lines))
             
-            result = self._run_command(cmd, capture_output=True)
-            if result and result.returncode == 0:
-                lines = result.stdout.strip().split('\n')
-                
-                # 確保有足夠的資料行
-                while len(lines) < 9:
-                    lines.append('')
-                
-                # 計算相對路徑（如果是遞迴模式）
-                if recursive:
-                    try:
-                        rel_path = file_path.relative_to(dir_path)
-                    except ValueError:
-                        rel_path = file_path
-                else:
-                    rel_path = file_path.name
-                
-                # 準備資料行
-                row_data = {
-                    'filename': file_path.name,
-                    'filepath': str(rel_path),
-                    'codec_name': lines[0] if len(lines) > 0 else '',
-                    'profile': lines[1] if len(lines) > 1 else '',
-                    'codec_type': lines[2] if len(lines) > 2 else '',
-                    'codec_tag_string': lines[3] if len(lines) > 3 else '',
-                    'width': lines[4] if len(lines) > 4 else '',
-                    'height': lines[5] if len(lines) > 5 else '',
-                    'pix_fmt': lines[6] if len(lines) > 6 else '',
-                    'avg_frame_rate': lines[7] if len(lines) > 7 else '',
-                    'duration': lines[8] if len(lines) > 8 else ''
-                }
-                
-                rows.append(row_data)
-                processed_count += 1
-        
-        if not rows:
-            print("沒有找到可處理的媒體檔案")
-            return
+            if output_csv:
+                if writer is None:
+                    csv_file = open(output_csv, 'w', newline='', encoding='utf-8')
+                    writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+                    writer.writeheader()
+                writer.writerow(row_data)
+            else:
+                # 輸出到終端機
+                if processed_count == 0:
+                    print(','.join(f'"{field}"' for field in fieldnames))
+                print(','.join(f'"{row_data.get(field, "")}"' for field in fieldnames), flush=True)
+            processed_count += 1
         
-        print(f"✅ 處理了 {processed_count} 個媒體檔案")
+        def drain(block):
+            # 依掃描順序輸出佇列前端已完成的結果；block 時等待前端的 probe 完成
+            while pending:
+                file_path, key, item = pending[0]
+                if isinstance(item, Future):
+                    if not block and not item.done():
+                        return
+                    item = item.result()
+                    if cache is not None:
+                        cache.put(*key, item)
+                pending.popleft()
+                if item is not None:
+                    emit(file_path, item)
         
-        # 輸出結果
+        # 佇列中依掃描順序放 (檔案, 快取 key, Future 或快取結果)，最多 jobs * 4 筆
+        pending = deque()
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                for file_path in files:
+                    if not file_path.is_file():
+                        continue
+                    if not probe_all and not self.is_probable_media(file_path):
+                        continue
+                    
+                    stat = file_path.stat()
+                    key = (str(file_path.resolve()), stat.st_size, stat.st_mtime)
+                    hit, lines = cache.get(*key) if cache is not None else (False, None)
+                    if hit:
+                        cached_count += lines is not None
+                        pending.append((file_path, key, lines))
+                    else:
+                        pending.append((file_path, key, executor.submit(self._probe_file, file_path)))
+                    
+                    drain(block=False)
+                    if len(pending) >= jobs * 4:
+                        # 前端必定是尚未完成的 probe，等它完成後再繼續掃描
+                        pending[0][2].result()
+                        drain(block=False)
+                drain(block=True)
+        finally:
+            if csv_file is not None:
+                csv_file.close()
+            if cache is not None:
+                cache.close()
+        
+        if not processed_count:
+            self.log("沒有找到可處理的媒體檔案")
+            return
+        
+        self.log(f"✅ 處理了 {processed_count} 個媒體檔案（其中 {cached_count} 個來自快取）")
         if output_csv:
-            # 輸出到 CSV 檔案
-            csv_path = Path(output_csv)
-            try:
-                with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-                    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                    writer.writeheader()
-                    writer.writerows(rows)
-                print(f"✅ CSV 檔案已儲存到：{csv_path}")
-            except Exception as e:
-                print(f"❌ 無法寫入 CSV 檔案：{e}")
-        else:
-            # 輸出到終端機
-            print(','.join(f'"{field}"' for field in fieldnames))
-            for row in rows:
-                row_values = [row.get(field, '') for field in fieldnames]
-                print(','.join(f'"{value}"' for value in row_values))
+            self.log(f"✅ CSV 檔案已儲存到：{output_csv}")
 
 def create_parser():
     """建立命令行參數解析器"""
@@ -310,11 +707,14 @@ def create_parser():
     gif_parser.add_argument('input', help='輸入影片檔案')
     gif_parser.add_argument('--fps', type=int, default=15, help='FPS (預設: 15)')
     gif_parser.add_argument('--frames', type=int, help='畫面數限制')
+    gif_parser.add_argument('--two-pass', dest='two_pass', action='store_true', help='先輸出調色盤檔再轉換（解碼兩次，記憶體用量較低）')
     
     # 批次轉 GIF
     batch_gif_parser = subparsers.add_parser('batch-gif', help='批次轉換 MP4 為 GIF')
     batch_gif_parser.add_argument('--fps', type=int, default=15, help='FPS (預設: 15)')
     batch_gif_parser.add_argument('--directory', default='.', help='目標資料夾 (預設: 當前目錄)')
+    batch_gif_parser.add_argument('--jobs', '-j', type=int, default=1, help='同時轉換的影片數量 (預設: 1)')
+    batch_gif_parser.add_argument('--two-pass', dest='two_pass', action='store_true', help='先輸出調色盤檔再轉換（解碼兩次，記憶體用量較低）')
     
     # 抽取 JPG
     jpg_parser = subparsers.add_parser('extract-jpg', help='抽取 JPG 畫面')
@@ -329,12 +729,20 @@ def create_parser():
     # PNG 轉 JPG
     convert_parser = subparsers.add_parser('png2jpg', help='PNG 轉 JPG')
     convert_parser.add_argument('folder', help='目標資料夾')
+    convert_parser.add_argument('--engine', choices=['pillow', 'ffmpeg'], default='pillow', help='轉換方式 (預設: pillow，行程內轉換)')
+    convert_parser.add_argument('--jobs', '-j', type=int, help='同時轉換的數量 (預設: CPU 核心數)')
+    convert_parser.add_argument('--quality', type=int, default=95, help='Pillow 的 JPEG 品質 (預設: 95，約等於 -qscale:v 2)')
+    convert_parser.add_argument('--force', action='store_true', help='即使 JPG 比 PNG 新也重新轉換')
     
     # 掃描資訊
     probe_parser = subparsers.add_parser('probe-info', help='掃描影片資訊')
     probe_parser.add_argument('directory', help='目標資料夾')
     probe_parser.add_argument('--recursive', '-r', action='store_true', help='遞迴掃描子資料夾')
     probe_parser.add_argument('--csv', help='輸出 CSV 檔案路徑 (若未指定則輸出到終端機)')
+    probe_parser.add_argument('--jobs', '-j', type=int, help='同時執行的 ffprobe 數量 (預設: CPU 核心數)')
+    probe_parser.add_argument('--cache', default=DEFAULT_PROBE_CACHE, help='probe 結果快取檔案 (SQLite)')
+    probe_parser.add_argument('--no-cache', dest='no_cache', action='store_true', help='不使用 probe 快取')
+    probe_parser.add_argument('--all', dest='probe_all', action='store_true', help='不依副檔名 / 檔頭過濾，所有檔案都交給 ffprobe')
     
     # 批次重新命名
     rename_parser = subparsers.add_parser('batch-rename', help='批次重新命名')
@@ -365,17 +773,20 @@ def main():
     
     # 執行對應命令
     if args.command == 'gif':
-        processor.convert_to_gif(args.input, args.fps, args.frames)
+        processor.convert_to_gif(args.input, args.fps, args.frames, single_pass=not args.two_pass)
     elif args.command == 'batch-gif':
-        processor.batch_convert_gif(args.fps, args.directory)
+        processor.batch_convert_gif(args.fps, args.directory, args.jobs, single_pass=not args.two_pass)
     elif args.command == 'extract-jpg':
         processor.extract_jpg(args.input, args.fps)
     elif args.command == 'extract-png':
         processor.extract_png(args.input, args.fps)
     elif args.command == 'png2jpg':
-        processor.png2jpg(args.folder)
+        processor.png2jpg(args.folder, args.engine, args.jobs, args.quality, args.force)
     elif args.command == 'probe-info':
-        processor.probe_info(args.directory, args.recursive, args.csv)
+        processor.probe_info(
+            args.directory, args.recursive, args.csv, jobs=args.jobs,
+            cache_path=None if args.no_cache else args.cache, probe_all=args.probe_all,
+        )
     elif args.command == 'batch-rename':
         processor.batch_rename(args.format, args.new_name, args.start)
 
@@ -0,0 +1,71 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from DetectorTool.base import BaseDetector, Rect
+
+
+def create_fadeout_mask_loop(mask_size, origin_rect, blur_size):
+    """舊版逐像素實作，僅作為比對基準"""
+    x1, y1, x2, y2 = origin_rect.x1, origin_rect.y1, origin_rect.x2, origin_rect.y2
+    fade_mask = Image.new("L", mask_size, 0)
+    pixels = fade_mask.load()
+    for y in range(y1, y2):
+        for x in range(x1, x2):
+            dx = 0
+            if x < x1 + blur_size:
+                dx = x1 + blur_size - x
+            elif x > x2 - blur_size - 1:
+                dx = x - (x2 - blur_size - 1)
+            dy = 0
+            if y < y1 + blur_size:
+                dy = y1 + blur_size - y
+            elif y > y2 - blur_size - 1:
+                dy = y - (y2 - blur_size - 1)
+            d = (dx**2 + dy**2) ** 0.5
+            if d >= blur_size:
+                alpha = 0
+            else:
+                alpha = int(255 * (1 - d / blur_size))
+            pixels[x, y] = alpha
+    return fade_mask
+
+
+def timeit(fn, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+# python test/bench_fadeout_mask.py --size 2048 1152 --rect 600 200 1400 1000 --blur_size 32
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark create_fadeout_mask against the old per-pixel loop')
+    parser.add_argument('--size', type=int, nargs=2, default=[2048, 1152], metavar=('W', 'H'))
+    parser.add_argument('--rect', type=int, nargs=4, default=[600, 200, 1400, 1000], metavar=('X1', 'Y1', 'X2', 'Y2'))
+    parser.add_argument('-b', '--blur_size', type=int, default=32)
+    parser.add_argument('-r', '--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    mask_size = tuple(args.size)
+    rect = Rect(*args.rect)
+    detector = BaseDetector(make_dirs=False)
+
+    loop_time, expected = timeit(lambda: create_fadeout_mask_loop(mask_size, rect, args.blur_size), args.repeat)
+    vec_time, actual = timeit(lambda: detector.create_fadeout_mask(mask_size, rect, args.blur_size), args.repeat)
+
+    diff = np.abs(np.asarray(expected, dtype=np.int16) - np.asarray(actual, dtype=np.int16))
+    print(f"canvas {mask_size[0]}x{mask_size[1]}, rect {rect.width}x{rect.height}, blur_size {args.blur_size}")
+    print(f"loop:       {loop_time * 1000:10.2f} ms")
+    print(f"vectorized: {vec_time * 1000:10.2f} ms  ({loop_time / vec_time:.1f}x)")
+    print(f"max abs diff: {diff.max()}  (pixels differing: {np.count_nonzero(diff)})")
+    if diff.max() > 1:
+        sys.exit(1)
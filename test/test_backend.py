@@ -0,0 +1,90 @@
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+yolo = pytest.importorskip('imgutils.generic.yolo')
+
+from DetectorTool.HeadDetector import HeadDetector  # noqa: E402
+
+
+class FakeArg:
+    def __init__(self, name, shape):
+        self.name = name
+        self.shape = shape
+
+
+class FakeSession:
+    """
+    代替 ONNX session：輸出只由輸入像素決定（固定 4×4 格的 anchor，分數為各格的平均亮度），
+    前處理不同時結果就會不同
+    """
+
+    def __init__(self, size=(640, 640), batch='batch', classes=1):
+        self.size = size
+        self.batch = batch
+        self.classes = classes
+        self.calls = []
+
+    def get_inputs(self):
+        return [FakeArg('images', [self.batch, 3, self.size[1], self.size[0]])]
+
+    def get_outputs(self):
+        return [FakeArg('output0', None)]
+
+    def run(self, names, feeds):
+        data = feeds['images']
+        self.calls.append(len(data))
+        n, _, h, w = data.shape
+        cells = data.reshape(n, 3, 4, h // 4, 4, w // 4).mean(axis=(1, 3, 5)).reshape(n, 16)
+        cy, cx = np.divmod(np.arange(16), 4)
+        boxes = np.stack([(cx + 0.5) * w / 4, (cy + 0.5) * h / 4, np.full(16, w / 5), np.full(16, h / 5)])
+        output = np.empty((n, 4 + self.classes, 16), dtype=np.float32)
+        output[:, :4] = boxes
+        for c in range(self.classes):
+            output[:, 4 + c] = np.roll(cells, c, axis=1)
+        return [output]
+
+
+def make_images():
+    rng = np.random.default_rng(0)
+    images = []
+    for size in [(800, 600), (333, 1000), (640, 640), (1200, 400)]:
+        data = rng.integers(0, 256, (size[1] // 8, size[0] // 8, 3), dtype=np.uint8)
+        images.append(Image.fromarray(data).resize(size, Image.Resampling.NEAREST))
+    images.append(Image.new('RGBA', (500, 500), (255, 255, 255, 0)))
+    return images
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    session = FakeSession(size=(640, 480))
+    lock = threading.Lock()
+    # 逐張（detect_heads）與批次（from_imgutils）都經由 YOLOModel 取得同一個 session
+    monkeypatch.setattr(yolo.YOLOModel, '_open_model', lambda self, name: (session, (640, 480), ['head'], lock))
+    monkeypatch.setattr(yolo.YOLOModel, '_get_model_type', lambda self, model_name: 'yolo')
+    return session
+
+
+def test_batched_matches_sequential(fake_model, tmp_path):
+    images = make_images()
+    detector = HeadDetector(output=str(tmp_path))
+    sequential = [detector.detect(image) for image in images]
+    batched = detector.detect_batch(images, batch_size=4)
+    assert detector.get_batch_backend() is not None
+    assert fake_model.calls == [1] * len(images) + [4, 1]
+    assert batched == sequential
+    assert any(sequential)
+
+
+def test_fixed_batch_model_runs_per_image(fake_model, tmp_path):
+    fake_model.batch = 1
+    images = make_images()
+    detector = HeadDetector(output=str(tmp_path))
+    sequential = [detector.detect(image) for image in images]
+    assert detector.detect_batch(images, batch_size=8) == sequential
+    assert fake_model.calls == [1] * len(images) * 2
@@ -0,0 +1,77 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+pytest.importorskip('imgutils')
+
+from DetectorTool.base import BaseDetector  # noqa: E402
+from DetectorTool.tiling import merge_tiles, tile_grid  # noqa: E402
+
+
+class SquareBackend:
+    """
+    代替模型的批次後端：回傳每張分塊中各純色方塊的外接框（分塊內座標），
+    方塊被切在分塊邊緣時只回傳看得到的部分，與真實模型在接縫上的殘缺框相同
+    """
+
+    def __init__(self, colors):
+        self.colors = colors
+        self.calls = []
+
+    def __call__(self, images):
+        self.calls.append([image.size for image in images])
+        results = []
+        for image in images:
+            data = np.asarray(image.convert('RGB'))
+            result = []
+            for label, color in self.colors.items():
+                ys, xs = np.nonzero(np.all(data == color, axis=2))
+                if len(xs):
+                    result.append(((int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1), label, 0.9))
+            results.append(result)
+        return results
+
+
+def make_image(size, squares):
+    image = Image.new('RGB', size, (0, 0, 0))
+    for color, box in squares:
+        image.paste(color, box)
+    return image
+
+
+def test_detect_tiled_maps_boxes_to_global():
+    colors = {'a': (255, 0, 0), 'b': (0, 255, 0)}
+    image = make_image((1984, 1000), [(colors['a'], (100, 200, 180, 280)), (colors['b'], (1500, 700, 1600, 800))])
+    backend = SquareBackend(colors)
+    detector = BaseDetector(make_dirs=False, backend=backend)
+    result = detector.detect_tiled(image, tile_size=1024, overlap=64)
+    assert sorted(result, key=lambda det: det[1]) == [
+        ((100, 200, 180, 280), 'a', 0.9),
+        ((1500, 700, 1600, 800), 'b', 0.9),
+    ]
+    # 2×1 塊一次送進批次後端，每塊都是 tile_size 大小
+    assert backend.calls == [[(1024, 1000), (1024, 1000)]]
+
+
+def test_detect_tiled_merges_box_split_across_seam():
+    colors = {'head': (255, 0, 0)}
+    # 分塊為 x 0~1024 與 960~1984，方塊跨過兩塊的接縫
+    image = make_image((1984, 1000), [(colors['head'], (950, 100, 1150, 300))])
+    detector = BaseDetector(make_dirs=False, backend=SquareBackend(colors))
+    assert detector.detect_tiled(image, tile_size=1024, overlap=64) == [((950, 100, 1150, 300), 'head', 0.9)]
+
+
+def test_merge_tiles_keeps_neighbours_in_overlap():
+    tiles = tile_grid((1984, 1000), 1024, 64)
+    assert tiles == [(0, 0, 1024, 1000), (960, 0, 1984, 1000)]
+    # 左塊看到完整的頭與被切掉的鄰居殘片；右塊看到鄰居的完整框（分塊內座標）
+    results = [
+        [((970, 100, 1000, 130), 'head', 0.8), ((1004, 100, 1024, 130), 'head', 0.7)],
+        [((10, 100, 40, 130), 'head', 0.8), ((44, 100, 74, 130), 'head', 0.9)],
+    ]
+    merged = merge_tiles(results, tiles)
+    assert sorted(det[0] for det in merged) == [(970, 100, 1000, 130), (1004, 100, 1034, 130)]